@@ -2,17 +2,44 @@
 A module to create a progress bar in a Tkinter window.
 """
 
-import time
+import asyncio
+import base64
+from contextlib import aclosing
+import os
+from threading import BoundedSemaphore
 import tkinter as tk
 from tkinter import ttk, PhotoImage, BooleanVar
-
-from ffmpeg_progress_yield import FfmpegProgress
-from utils.threading_utils import CustomThread
+from typing import List, Tuple
 
 from utils.json_utils import load_translations, load_last_used_settings
+from utils.ffmpeg_utils import NVENC_MAX_SESSIONS, FfmpegPipeProgress
 from utils.window_utils import center_window
 
 
+def _read_asset(file_path: str) -> bytes:
+    """
+    Reads an image asset from disk, so it can be passed to PhotoImage(data=...).
+
+    :param file_path: The path to the image file.
+
+    :return: bytes, The base64 encoded content of the image.
+    """
+    with open(file_path, "rb") as f:
+        return base64.b64encode(f.read())
+
+
+# The assets are read once, every progress bar reuses the same bytes
+_CROSS_PNG = _read_asset("./assets/cross-button.png")
+_PLAY_PNG = _read_asset("./assets/play-button.png")
+_PAUSE_PNG = _read_asset("./assets/pause-button.png")
+
+# Maximum number of ffmpeg commands running at the same time, the semaphore is
+# shared by all the progress bars so parallel batches do not add up
+MAX_JOBS = min(4, os.cpu_count() or 1)
+_ffmpeg_slots = BoundedSemaphore(MAX_JOBS)
+_nvenc_slots = BoundedSemaphore(NVENC_MAX_SESSIONS)
+
+
 class CustomProgressBar:
     """
     A class to create and manage a progress bar in a Tkinter window.
@@ -42,7 +69,9 @@ class CustomProgressBar:
     - create_progress_bar()
     - create_pause_button()
     - set_label_text(text)
+    - update_label_text(text)
     - run_ffmpeg_with_progress(command)
+    - run_ffmpeg_jobs_with_progress(jobs)
     - run_progress_bar_sample()
     - update_progress(progress)
     """
@@ -64,9 +93,13 @@ class CustomProgressBar:
         json_translations = load_translations()[load_last_used_settings()[0]]
 
         self.with_pause_button = with_pause_button
+        self.master = master
 
         self._json_progress_bar = json_translations["ProgressBar"]
 
+        # ids of the progress updates scheduled with root.after and not run yet
+        self._after_ids: set[str] = set()
+
         if master:
             theme = ttk.Style(master)
             self.root = tk.Toplevel(
@@ -87,21 +120,23 @@ class CustomProgressBar:
 
         self.root.protocol("WM_DELETE_WINDOW", self._set_cancel_true)
 
-        self.progress_bar_label = ttk.Label(self.root, text="")
+        # The widgets are packed into this frame while it's detached, and the frame
+        # is packed into the window once, so the geometry is only resolved once
+        self.container = ttk.Frame(self.root)
 
-        self.cancel_button_img = PhotoImage(file="./assets/cross-button.png").subsample(
-            6, 6
-        )
+        self.progress_bar_label = ttk.Label(self.container, text="")
+
+        self.cancel_button_img = PhotoImage(data=_CROSS_PNG).subsample(6, 6)
 
         self.cancel_button = ttk.Button(
-            self.root, image=self.cancel_button_img, command=self._set_cancel_true
+            self.container, image=self.cancel_button_img, command=self._set_cancel_true
         )
 
         self.cancel = BooleanVar()
         self.cancel.set(False)
 
         self.cancel_all_button = ttk.Button(
-            self.root,
+            self.container,
             text=self._json_progress_bar["cancel_all_button"],
             command=self._set_cancel_all_true,
         )
@@ -109,30 +144,32 @@ class CustomProgressBar:
         self.cancel_all = BooleanVar()
         self.cancel_all.set(False)
 
+        # Bumped on every cancel, so the batch jobs running at that moment can
+        # tell they were cancelled
+        self._cancel_count = 0
+
         self.minimize = BooleanVar()
         self.minimize.set(False)
 
+        self.pause = BooleanVar()
+        self.pause.set(False)
+
         if self.with_pause_button:
-            self.play_btn_img = PhotoImage(file="./assets/play-button.png").subsample(
-                6, 6
-            )
-            self.pause_btn_img = PhotoImage(file="./assets/pause-button.png").subsample(
-                6, 6
-            )
+            self.play_btn_img = PhotoImage(data=_PLAY_PNG).subsample(6, 6)
+            self.pause_btn_img = PhotoImage(data=_PAUSE_PNG).subsample(6, 6)
             self.pause_button = ttk.Button(
-                self.root, image=self.pause_btn_img, command=self._pause_or_play
+                self.container, image=self.pause_btn_img, command=self._pause_or_play
             )
 
-            self.pause = BooleanVar()
-            self.pause.set(False)
-
         self.progress_bar = ttk.Progressbar(
-            self.root,
+            self.container,
             orient="horizontal",
             length=200,
             mode="determinate",
         )
-        self.progress_bar_percentage_label = ttk.Label(self.root, text="")
+        self.progress_bar_percentage_label = ttk.Label(
+            self.container, text="", justify="center"
+        )
 
         # configure_binding = self.root.bind("<Configure>", print_window_size)
 
@@ -158,6 +195,22 @@ class CustomProgressBar:
         self.minimize.set(False)
         self.root.deiconify()
 
+    def _show_window(self) -> None:
+        """
+        Iconifies or deiconifies the window according to the minimize state,
+        without sending a window manager request when it is already in that state.
+
+        :return: None.
+        """
+        state = self.root.state()
+
+        if self.minimize.get():
+            if state != "iconic":
+                self.root.iconify()
+
+        elif state != "normal":
+            self.root.deiconify()
+
     def create_progress_bar(self, master: tk.Tk | tk.Toplevel | None = None) -> None:
         """
         Creates a progress bar and displays it on the screen.
@@ -173,11 +226,13 @@ class CustomProgressBar:
         self.progress_bar["value"] = 0
         self.progress_bar.pack(fill="both", expand=True)
 
-        self.progress_bar_percentage_label.config(text="0%", justify="center")
+        self.progress_bar_percentage_label.config(text="0%")
         self.progress_bar_percentage_label.pack(anchor="s")
 
         self.cancel_all_button.pack(side="bottom", anchor="s")
 
+        self.container.pack(fill="both", expand=True)
+
         center_window(self.root, master)
 
         self.root.resizable(False, False)
@@ -204,6 +259,26 @@ class CustomProgressBar:
         if self.minimize.get():
             self.root.iconify()
 
+    def update_label_text(self, text: str) -> None:
+        """
+        Function to change the label text of a window that is already shown.
+
+        Unlike set_label_text, the window is only resized and centered again
+        when the new text does not fit in it, so it doesn't jump around on every
+        file of a batch.
+
+        :param text: The text to be displayed in the progress bar label.
+
+        :return: None.
+        """
+        self.progress_bar_label.config(text=text)
+
+        if (
+            self.progress_bar_label.winfo_reqwidth()
+            > self.progress_bar_label.winfo_width()
+        ):
+            center_window(self.root, self.master)
+
     def create_pause_button(self) -> None:
         """
         Function to create the pause button.
@@ -226,13 +301,12 @@ class CustomProgressBar:
 
         :return: None.
         """
-        if self.minimize.get():
-            self.root.iconify()
-        else:
-            self.root.deiconify()
+        self._show_window()
+
+        progress = progress if isinstance(progress, int) else int(progress)
 
-        self.progress_bar["value"] = int(progress)
-        self.progress_bar_percentage_label.config(text=f"{progress}%", justify="center")
+        self.progress_bar["value"] = progress
+        self.progress_bar_percentage_label.config(text=f"{progress}%")
 
         if not self.minimize.get():
             self.root.update_idletasks()
@@ -247,8 +321,10 @@ class CustomProgressBar:
         """
 
         # print(self.progress)
-        self.progress_bar["value"] = int(progress)
-        self.progress_bar_percentage_label.config(text=f"{progress}%", justify="center")
+        progress = progress if isinstance(progress, int) else int(progress)
+
+        self.progress_bar["value"] = progress
+        self.progress_bar_percentage_label.config(text=f"{progress}%")
 
         if self.minimize.get():
             self.root.iconify()
@@ -259,74 +335,209 @@ class CustomProgressBar:
         """
         Runs a sample progress bar in a window.
 
+        Must be called from the Tk main thread, the progress is driven by
+        root.after callbacks while the mainloop is running.
+
         :return: None.
         """
-        if self.minimize.get():
-            self.root.iconify()
-        else:
-            self.root.deiconify()
+        self._show_window()
 
-        for progress in range(0, 101):
-            time.sleep(0.1)
+        self.root.after(0, self._tick)
 
-            if self.cancel.get():
-                self.cancel.set(False)
-                self.root.quit()
-                break
+    def _tick(self, progress: int = 0) -> None:
+        """
+        Advances the sample progress bar by one step and schedules the next one.
 
-            if self.cancel_all.get():
-                self.cancel_all.set(False)
-                self.root.quit()
-                break
+        :param progress: The progress to be displayed in the progress bar.
 
-            if not self.pause.get():
-                self.root.after(10, self._update_progress, progress)
+        :return: None.
+        """
+        if self.cancel.get() or self.cancel_all.get() or progress > 100:
+            self.cancel.set(False)
+            self.cancel_all.set(False)
+            self.root.quit()
+            return
 
-            else:
-                self.root.wait_variable(self.pause)
+        if self.pause.get():
+            self.root.after(100, self._tick, progress)
+            return
 
-        self.root.quit()
+        self._update_progress(progress)
+        self.root.after(100, self._tick, progress + 1)
 
-    def run_ffmpeg_with_progress(self, command: FfmpegProgress) -> bool | str:
+    def run_ffmpeg_with_progress(self, command: FfmpegPipeProgress) -> bool | str:
         """
-        Runs a command with progress updates in a window.
+        Runs a command with progress updates in a window, as a batch of one job
+        run by run_ffmpeg_jobs_with_progress. Like it, it must be run in a
+        separate thread while the window mainloop is running.
 
-        :param command: FfmpegProgress - The command to run with progress.
+        :param command: FfmpegPipeProgress - The command to run with progress.
 
-        :raises string error: If the command fails to run.
+        :return: bool | str - True if the command ran successfully or was
+            cancelled, False if all the commands were cancelled and "error" if
+            it failed, in which case the window is withdrawn.
+        """
+        # The command goes through the batch runner, so its output is read by
+        # the event loop like any other job, keeping the current label text
+        result = self.run_ffmpeg_jobs_with_progress(
+            [(self.progress_bar_label.cget("text"), [command])]
+        )[0]
 
-        :return: bool - True if the command ran successfully, False otherwise.
+        if result == "error":
+            self.root.withdraw()
+
+        # A cancelled command is not an error, the caller moves on to the next one
+        return True if result is None else result
+
+    def run_ffmpeg_jobs_with_progress(
+        self,
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]],
+        max_workers: int = MAX_JOBS,
+    ) -> List[bool | str | None]:
         """
-        if self.minimize.get():
-            self.root.iconify()
+        Runs several jobs at the same time, showing their overall progress.
 
-        else:
-            self.root.deiconify()
+        Each job is a label text and a list of commands, a command is only run
+        if the previous one failed. The jobs run in an asyncio event loop, so a
+        single thread follows all of them. Like run_ffmpeg_with_progress, it must
+        be run in a separate thread while the window mainloop is running.
+
+        :param jobs: List[Tuple[str, List[FfmpegPipeProgress]]], The jobs to run.
+        :param max_workers: int, The maximum number of jobs running at once.
+
+        :return: List[bool | str | None], The result of each job, True if it ran
+            successfully, None if it was cancelled, False if all the jobs were
+            cancelled and "error" if all of its commands failed.
+        """
+        self._show_window()
+
+        jobs_progress = [0] * len(jobs)
+        last_progress = -1
+
+        def report(index: int, progress: int) -> None:
+            nonlocal last_progress
+
+            jobs_progress[index] = progress
+            total_progress = sum(jobs_progress) // len(jobs)
+
+            if total_progress != last_progress:
+                last_progress = total_progress
+                self._schedule_update(total_progress)
+
+        async def acquire_slot(slots: BoundedSemaphore) -> None:
+            # The slots are shared with other threads, so the wait runs in a
+            # worker thread only when no slot is free right away
+            if not slots.acquire(blocking=False):
+                await asyncio.to_thread(slots.acquire)
+
+        async def run_command(
+            index: int, command: FfmpegPipeProgress, cancel_count: int
+        ) -> bool | None:
+            # Consumer GPUs only open a few encoding sessions at once, the
+            # commands that encode with NVENC wait for one of them
+            uses_nvenc = "h264_nvenc" in command.cmd
+
+            if uses_nvenc:
+                await acquire_slot(_nvenc_slots)
+
+            try:
+                async with aclosing(
+                    command.run_command_with_progress_async()
+                ) as progress_iter:
+                    async for progress in progress_iter:
+                        if self.cancel_all.get():
+                            await command.quit_gracefully_async()
+                            return False
+
+                        if self._cancel_count != cancel_count:
+                            await command.quit_gracefully_async()
+                            report(index, 100)
+                            return None
+
+                        report(index, progress)
+
+            finally:
+                if uses_nvenc:
+                    _nvenc_slots.release()
+
+            return True
+
+        async def run_job(
+            index: int, semaphore: asyncio.Semaphore
+        ) -> bool | str | None:
+            label, commands = jobs[index]
+
+            async with semaphore:
+                await acquire_slot(_ffmpeg_slots)
+
+                try:
+                    if self.cancel_all.get():
+                        return False
+
+                    cancel_count = self._cancel_count
+                    self.root.after(0, self.update_label_text, label)
+
+                    for command in commands:
+                        report(index, 0)
+
+                        # A command that cannot be started, like a missing
+                        # executable, fails the same way as one that errors out
+                        try:
+                            return await run_command(index, command, cancel_count)
+                        except (RuntimeError, OSError):
+                            continue
+
+                finally:
+                    _ffmpeg_slots.release()
 
+            return "error"
+
+        async def run_jobs() -> List[bool | str | None]:
+            semaphore = asyncio.Semaphore(max_workers)
+
+            return await asyncio.gather(
+                *(run_job(i, semaphore) for i in range(len(jobs)))
+            )
+
+        # A single event loop follows the output of every ffmpeg process
         try:
-            for progress in command.run_command_with_progress({"shell": True}):
-                if self.cancel.get():
-                    command.quit_gracefully()
-                    self.root.quit()
-                    self.cancel.set(False)
-                    break
-
-                if self.cancel_all.get():
-                    command.quit_gracefully()
-                    self.root.quit()
-                    self.cancel_all.set(False)
-                    return False
-
-                self.root.after(10, self._update_progress, progress)
-
-        except RuntimeError:
-            self.root.withdraw()
+            return asyncio.run(run_jobs())
+
+        finally:
+            self.cancel.set(False)
+            self.cancel_all.set(False)
             self.root.quit()
-            return "error"
 
-        self.root.quit()
+    def _schedule_update(self, progress: int | float) -> None:
+        """
+        Schedules a progress update in the Tk event loop, keeping track of its id
+        so it can be cancelled if the window is closed before it runs.
+
+        :param progress: The progress to be displayed in the progress bar.
+
+        :return: None.
+        """
+
+        def run_update() -> None:
+            self._after_ids.discard(after_id)
+            self._update_progress(progress)
 
-        return True
+        after_id = self.root.after(10, run_update)
+        self._after_ids.add(after_id)
+
+    def _cancel_pending_updates(self) -> None:
+        """
+        Cancels the progress updates that were scheduled but did not run yet.
+
+        :return: None.
+        """
+        for after_id in tuple(self._after_ids):
+            try:
+                self.root.after_cancel(after_id)
+            except tk.TclError:
+                pass
+
+        self._after_ids.clear()
 
     def _pause_or_play(self) -> None:
         """
@@ -349,15 +560,9 @@ class CustomProgressBar:
         :return: None.
         """
         self.cancel.set(True)
-
-        try:
-            if self.pause.get():
-                self.pause.set(False)
-            else:
-                self.pause.set(True)
-
-        except AttributeError:
-            pass
+        self._cancel_count += 1
+        self.pause.set(not self.pause.get())
+        self._cancel_pending_updates()
 
     def _set_cancel_all_true(self) -> None:
         """
@@ -366,15 +571,8 @@ class CustomProgressBar:
         :return: None.
         """
         self.cancel_all.set(True)
-
-        try:
-            if self.pause.get():
-                self.pause.set(False)
-            else:
-                self.pause.set(True)
-
-        except AttributeError:
-            pass
+        self.pause.set(not self.pause.get())
+        self._cancel_pending_updates()
 
 
 if __name__ == "__main__":
@@ -384,10 +582,6 @@ if __name__ == "__main__":
 
     barra.set_label_text("Carregando [nome do arquivo e subtitulo]...")
 
-    progress_thread = CustomThread(target=barra.run_progress_bar_sample)
-
-    progress_thread.start()
+    barra.run_progress_bar_sample()
 
     barra.root.mainloop()
-
-    progress_thread.join()
@@ -21,7 +21,7 @@ from utils.window_utils import center_window
 from utils.ffmpeg_utils import (
     configure_font_subtitles_win,
     check_ffmpeg_tkinter,
-    is_video_or_audio_file,
+    classify_video_or_audio_files,
     extract_subtitle,
 )
 from video_adjuster import VideoAdjuster
@@ -349,7 +349,8 @@ class VideoConverterApp(App):
             )
 
         def check_files(files: List[Path]) -> List[Path]:
-            input_files = [file for file in files if is_video_or_audio_file(file)]
+            classified = classify_video_or_audio_files(files)
+            input_files = [file for file in files if classified[str(file)]]
 
             return input_files
 
@@ -632,7 +633,10 @@ class ChangeVideoAttributesApp(App):
             )
             return
 
-        input_files = list(input_folder.glob("*"))
+        # The entries carry their type, so the subfolders are left out without a
+        # stat call instead of being handed to ffprobe
+        with os.scandir(input_folder) as entries:
+            input_files = [Path(entry.path) for entry in entries if entry.is_file()]
 
         if len(input_files) > 50:
             messagebox.showinfo(
@@ -642,7 +646,8 @@ class ChangeVideoAttributesApp(App):
             )
 
         def check_files(files: List[Path]) -> List[Path]:
-            input_files = [file for file in files if is_video_or_audio_file(file)]
+            classified = classify_video_or_audio_files(files)
+            input_files = [file for file in files if classified[str(file)]]
 
             return input_files
 
@@ -24,18 +24,41 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
+from functools import lru_cache
 from pathlib import Path
+import shutil
 import subprocess
-from typing import List, Tuple
-from tkinter import messagebox, filedialog
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple
 
 from dotenv import load_dotenv
 
+# When run as a script, the utils package is imported from the repository root
 if __name__ == "__main__":
-    from json_utils import load_translations, load_last_used_settings
-else:
-    from utils.json_utils import load_translations, load_last_used_settings
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_utils import load_translations, load_last_used_settings
+from utils.ffprobe_cache import CREATION_FLAGS, probe
+
+# Whether check_ffmpeg_tkinter already loaded the .env file
+_ENV_LOADED = False
+
+# Whether configure_font_subtitles_win already ran
+_FONTS_CONFIGURED = False
+
+# Maximum number of ffmpeg/ffprobe processes running at the same time
+_MAX_WORKERS = min(os.cpu_count() or 4, 8)
+
+# NVENC preset and constant quality used when a video has to be re-encoded
+NVENC_PRESET = "p4"
+NVENC_CQ = 23
+
+# Consumer NVIDIA cards refuse to open more encoding sessions than this at once
+NVENC_MAX_SESSIONS = 2
 
 
 def check_ffmpeg_tkinter() -> str | None:
@@ -48,12 +71,15 @@ def check_ffmpeg_tkinter() -> str | None:
 
     :return: The path to the ffmpeg binaries if they pass all the checks, otherwise returns None.
     """
-    load_dotenv(os.path.abspath(".env"), override=True, encoding="utf-8")
+    global _ENV_LOADED
 
-    os.environ["FFMPEG_DIRECTORY"] = str(os.getenv("FFMPEG_FOLDER"))
+    # The .env file is only parsed again after it's rewritten below
+    if not _ENV_LOADED:
+        load_dotenv(os.path.abspath(".env"), override=True, encoding="utf-8")
 
-    translations = load_translations()
-    json_translations = translations[load_last_used_settings()[0]]
+        os.environ["FFMPEG_DIRECTORY"] = str(os.getenv("FFMPEG_FOLDER"))
+
+        _ENV_LOADED = True
 
     try:
         binaries = _check()
@@ -61,6 +87,11 @@ def check_ffmpeg_tkinter() -> str | None:
         return binaries
 
     except (FileNotFoundError, KeyError, ValueError) as e:
+        # Imported here so CLI usages of _check() don't pay the Tk import cost
+        from tkinter import messagebox, filedialog
+
+        json_translations = load_translations()[load_last_used_settings()[0]]
+
         if isinstance(e, ValueError):
             messagebox.showerror(
                 json_translations["MessageBox"]["error"],
@@ -115,10 +146,485 @@ def _check():
     return binaries
 
 
+@lru_cache(maxsize=None)
+def _ffmpeg_listing(option: str) -> bytes:
+    """
+    Get what ffmpeg lists for the given option, like "-encoders" or "-filters".
+    ffmpeg is only asked once per option, the answer is cached for the rest of
+    the run.
+
+    :param option: str, The listing option.
+
+    :return: bytes, The listing, empty if ffmpeg cannot be run.
+    """
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", option],
+            check=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATION_FLAGS,
+        )
+
+    except (OSError, subprocess.CalledProcessError):
+        return b""
+
+    return result.stdout
+
+
+def nvenc_available() -> bool:
+    """
+    Check if ffmpeg was built with the NVIDIA h264 encoder.
+
+    :return: bool, True if h264_nvenc is listed among the ffmpeg encoders.
+    """
+    return b" h264_nvenc " in _ffmpeg_listing("-encoders")
+
+
+def video_encoder_args() -> List[Tuple[List[str], List[str]]]:
+    """
+    Get the ffmpeg arguments to re-encode a video as h264, on the GPU with
+    NVENC when ffmpeg was built with it, and with libx264.
+
+    ffmpeg drives NVDEC/NVENC itself here, instead of a separate binding like
+    PyNvVideoCodec: the re-encode is only a fallback, and a single ffmpeg run
+    also copies the audio and subtitles and reports its progress.
+
+    The common windows builds list NVENC even on machines without an NVIDIA
+    GPU, and NVDEC doesn't decode every source, so libx264 is always the last
+    choice, for when the NVENC command fails.
+
+    The output is always 8 bit yuv420p, the only pixel format consumer NVENC
+    and most players take for h264, so 10 bit sources are converted.
+
+    :return: List[Tuple[List[str], List[str]]], In order of preference, the
+        arguments that go before the input file and the video encoder arguments.
+    """
+    libx264 = ([], ["-c:v", "libx264", "-pix_fmt", "yuv420p"])
+
+    if not nvenc_available():
+        return [libx264]
+
+    nvenc_args = ["-c:v", "h264_nvenc", "-preset", NVENC_PRESET, "-cq", str(NVENC_CQ)]
+
+    # The decoded frames stay in the GPU memory until they are encoded, the
+    # pixel format is converted there too when scale_cuda is available
+    if b" scale_cuda " in _ffmpeg_listing("-filters"):
+        nvenc = (
+            ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+            ["-vf", "scale_cuda=format=yuv420p", *nvenc_args],
+        )
+    else:
+        nvenc = (["-hwaccel", "cuda"], ["-pix_fmt", "yuv420p", *nvenc_args])
+
+    return [nvenc, libx264]
+
+
+# Tools that can edit the title in the file header, by file extension
+_TITLE_EDITORS = {
+    ".mka": "mkvpropedit",
+    ".mkv": "mkvpropedit",
+    ".webm": "mkvpropedit",
+    ".m4a": "AtomicParsley",
+    ".m4v": "AtomicParsley",
+    ".mov": "AtomicParsley",
+    ".mp4": "AtomicParsley",
+}
+
+
+@lru_cache(maxsize=None)
+def _find_tool(name: str) -> str | None:
+    """
+    Find the given executable in the PATH, once per run.
+
+    :param name: str, The name of the executable.
+
+    :return: str | None, The path to the executable, None if it's not installed.
+    """
+    return shutil.which(name)
+
+
+def set_title_in_place(file_path: str, title: str) -> bool:
+    """
+    Set the title of a Matroska or MP4 file by editing its header in place,
+    with mkvpropedit or AtomicParsley, instead of copying all of its streams.
+
+    :param file_path: str, The path to the media file.
+    :param title: str, The new title.
+
+    :return: bool, True if the title was set, False if there is no tool for
+        this format or the edit failed, so the caller can fall back to ffmpeg.
+    """
+    tool_name = _TITLE_EDITORS.get(os.path.splitext(file_path)[1].lower())
+    tool = _find_tool(tool_name) if tool_name else None
+
+    if tool is None:
+        return False
+
+    if tool_name == "mkvpropedit":
+        command = [tool, file_path, "--edit", "info", "--set", f"title={title}"]
+    else:
+        command = [tool, file_path, "--title", title, "--overWrite"]
+
+    try:
+        subprocess.run(
+            command,
+            check=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATION_FLAGS,
+        )
+
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+    return True
+
+
+def get_duration(input_file: Path | str) -> float | None:
+    """
+    Get the duration of the given media file using ffprobe.
+
+    :param input_file: Path | str, The path to the media file.
+
+    :return: float, The duration in seconds, or None if it cannot be probed.
+    """
+    try:
+        return float(probe(input_file)["format"]["duration"])
+    except (KeyError, ValueError):
+        return None
+
+
+class FfmpegPipeProgress:
+    """
+    Runs an ffmpeg command and yields its progress, read from the key=value
+    lines that ffmpeg writes with "-progress pipe:1".
+
+    The total duration is probed once with ffprobe, so no log line has to be
+    matched against a regex while the command runs.
+
+    Example usage:
+        command = FfmpegPipeProgress(["ffmpeg", "-i", "input.mkv", "output.mp4"])
+
+        # inside a coroutine
+        async for progress in command.run_command_with_progress_async():
+            print(f"{progress}%")
+    """
+
+    def __init__(self, cmd: List[str]) -> None:
+        """
+        Initializes the command.
+
+        :param cmd: List[str], The ffmpeg command, as an argv list.
+
+        :return: None.
+        """
+        self.cmd = cmd
+        self.async_process: asyncio.subprocess.Process | None = None
+        self.stderr = ""
+
+    def _input_file(self) -> str | None:
+        """
+        Returns the first input file of the command, used to probe the duration.
+
+        :return: str | None.
+        """
+        try:
+            return self.cmd[self.cmd.index("-i") + 1]
+        except (ValueError, IndexError):
+            return None
+
+    def _total_us(self) -> int:
+        """
+        Returns the duration of the input file in microseconds, 0 if unknown.
+
+        :return: int.
+        """
+        input_file = self._input_file()
+        duration = get_duration(input_file) if input_file else None
+
+        return int(duration * 1_000_000) if duration else 0
+
+    def _progress_cmd(self) -> List[str]:
+        """
+        Returns the command with the options that make ffmpeg report its progress.
+
+        The banner and the informational log are turned off, so the pipe only
+        carries the progress lines and the errors kept in self.stderr.
+
+        :return: List[str].
+        """
+        return [
+            self.cmd[0],
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-progress",
+            "pipe:1",
+            "-nostats",
+            *self.cmd[1:],
+        ]
+
+    @staticmethod
+    def _parse_line(line: str, total_us: int) -> int | None:
+        """
+        Parses a line of the ffmpeg output.
+
+        :param line: str, The line, as written by ffmpeg.
+        :param total_us: int, The duration of the input file in microseconds.
+
+        :raises ValueError: If the line is not a key=value progress line.
+
+        :return: int | None, The progress in percent, or None if the line is a
+            progress line that does not carry the current time.
+        """
+        key, sep, value = line.rstrip().partition("=")
+
+        if not (sep and key.isidentifier()):
+            raise ValueError(line)
+
+        # "out_time_ms" is also in microseconds, it's a known ffmpeg quirk
+        if key in ("out_time_us", "out_time_ms") and total_us:
+            try:
+                return min(100, int(value) * 100 // total_us)
+            except ValueError:
+                return None
+
+        return None
+
+    @staticmethod
+    def _ends_update(line: str) -> bool:
+        """
+        Tells if the given progress line is the last one of an update, ffmpeg
+        ends each block of key=value lines with a "progress" key.
+
+        :param line: str, The progress line, as written by ffmpeg.
+
+        :return: bool.
+        """
+        return line.startswith("progress=")
+
+    def _check_returncode(self, returncode: int | None, log_lines: List[str]) -> None:
+        """
+        Keeps the ffmpeg log and raises if the command failed.
+
+        :param returncode: int | None, The return code of ffmpeg.
+        :param log_lines: List[str], The lines of the log written by ffmpeg.
+
+        :raises RuntimeError: If the ffmpeg command failed.
+
+        :return: None.
+        """
+        self.stderr = "".join(log_lines)
+
+        if returncode != 0:
+            raise RuntimeError(f"Error running command {self.cmd}: {self.stderr}")
+
+    async def run_command_with_progress_async(
+        self, popen_kwargs: dict | None = None
+    ) -> AsyncIterator[int]:
+        """
+        Runs the command, yielding its progress in percent on every update
+        ffmpeg writes, even when it did not change, so the caller can check for
+        a cancel between them. The output is read by the running event loop, so
+        many commands can be followed by one thread.
+
+        :param popen_kwargs: dict, Extra keyword arguments passed to
+            asyncio.create_subprocess_exec, the console window is hidden on
+            windows unless creationflags is given.
+
+        :raises RuntimeError: If the ffmpeg command fails.
+
+        :return: AsyncIterator[int], The progress, from 0 to 100.
+        """
+        # ffprobe may have to run, so it's kept out of the event loop thread
+        total_us = await asyncio.to_thread(self._total_us)
+
+        self.async_process = await asyncio.create_subprocess_exec(
+            *self._progress_cmd(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            **{"creationflags": CREATION_FLAGS, **(popen_kwargs or {})},
+        )
+
+        log_lines: List[str] = []
+        current_progress = 0
+
+        assert self.async_process.stdout is not None
+        async for raw_line in self.async_process.stdout:
+            line = raw_line.decode("utf-8", errors="replace")
+
+            try:
+                progress = self._parse_line(line, total_us)
+            except ValueError:
+                log_lines.append(line)
+                continue
+
+            if progress is not None:
+                current_progress = max(current_progress, progress)
+
+            if self._ends_update(line):
+                yield current_progress
+
+        await self.async_process.wait()
+        self._check_returncode(self.async_process.returncode, log_lines)
+
+        yield 100
+
+    async def quit_gracefully_async(self) -> None:
+        """
+        Asks ffmpeg to stop, the same way as pressing "q" in the terminal.
+
+        :return: None.
+        """
+        if self.async_process is None or self.async_process.returncode is not None:
+            return
+
+        await self.async_process.communicate(input=b"q")
+
+
+class MkvmergeProgress(FfmpegPipeProgress):
+    """
+    Runs an mkvmerge command and yields its progress, read from the lines that
+    mkvmerge writes in GUI mode. It has the same interface as FfmpegPipeProgress,
+    so either can be the fallback of the other.
+
+    Example usage:
+        command = MkvmergeProgress(["mkvmerge", "-o", "out.mkv", "in.mkv", "in.srt"])
+
+        # inside a coroutine
+        async for progress in command.run_command_with_progress_async():
+            print(f"{progress}%")
+    """
+
+    _PROGRESS_PREFIX = "#GUI#progress "
+
+    def _total_us(self) -> int:
+        """
+        mkvmerge reports its progress in percent, so no duration is probed.
+
+        :return: int, Always 0.
+        """
+        return 0
+
+    def _progress_cmd(self) -> List[str]:
+        """
+        Returns the command with the option that makes mkvmerge write its
+        progress as one line per update.
+
+        :return: List[str].
+        """
+        return [self.cmd[0], "--gui-mode", *self.cmd[1:]]
+
+    @staticmethod
+    def _parse_line(line: str, total_us: int) -> int | None:
+        """
+        Parses a line of the mkvmerge output.
+
+        :param line: str, The line, as written by mkvmerge.
+        :param total_us: int, Unused, the progress is already in percent.
+
+        :raises ValueError: If the line is not a progress line.
+
+        :return: int | None, The progress in percent, or None if it's malformed.
+        """
+        if not line.startswith(MkvmergeProgress._PROGRESS_PREFIX):
+            raise ValueError(line)
+
+        try:
+            return min(
+                100,
+                int(line[len(MkvmergeProgress._PROGRESS_PREFIX) :].strip().rstrip("%")),
+            )
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _ends_update(line: str) -> bool:
+        """
+        Each progress line of mkvmerge is a whole update.
+
+        :param line: str, The progress line, as written by mkvmerge.
+
+        :return: bool, Always True.
+        """
+        return True
+
+    def _check_returncode(self, returncode: int | None, log_lines: List[str]) -> None:
+        """
+        Keeps the mkvmerge log and raises if the command failed. The return
+        code 1 only means there were warnings, the output is complete.
+
+        :param returncode: int | None, The return code of mkvmerge.
+        :param log_lines: List[str], The lines of the log written by mkvmerge.
+
+        :raises RuntimeError: If the mkvmerge command failed.
+
+        :return: None.
+        """
+        super()._check_returncode(0 if returncode == 1 else returncode, log_lines)
+
+    async def quit_gracefully_async(self) -> None:
+        """
+        Stops mkvmerge, it doesn't read commands from its input like ffmpeg.
+
+        :return: None.
+        """
+        if self.async_process is None or self.async_process.returncode is not None:
+            return
+
+        self.async_process.terminate()
+        await self.async_process.wait()
+
+
+def mkvmerge_subtitle_command(
+    input_file: str,
+    subtitle: str,
+    subtitle_title: str,
+    output_file: str,
+    subtitle_charset: str | None = None,
+) -> MkvmergeProgress | None:
+    """
+    Build the mkvmerge command that adds the given subtitle to a video.
+
+    :param input_file: str, The path to the video file.
+    :param subtitle: str, The path to the subtitle file.
+    :param subtitle_title: str, The name of the subtitle track.
+    :param output_file: str, The path to the merged Matroska file.
+    :param subtitle_charset: str | None, The encoding of the subtitle, None if
+        it's UTF-8 or starts with a BOM.
+
+    :return: MkvmergeProgress | None, The command, None if mkvmerge is not
+        installed.
+    """
+    mkvmerge = _find_tool("mkvmerge")
+
+    if mkvmerge is None:
+        return None
+
+    # The options before a file apply to that file's tracks
+    subtitle_options = ["--track-name", f"0:{subtitle_title}"]
+
+    if subtitle_charset is not None:
+        subtitle_options += ["--sub-charset", f"0:{subtitle_charset}"]
+
+    return MkvmergeProgress(
+        [mkvmerge, "-o", output_file, input_file, *subtitle_options, subtitle]
+    )
+
+
 def configure_font_subtitles_win(binaries):
     """
     Configure the fonts for the subtitles on windows.
+    Only the first call in the process does any work.
     """
+    global _FONTS_CONFIGURED
+
+    if _FONTS_CONFIGURED:
+        return
 
     # The fonts.conf must be under the directory with ffmpeg executable
     fonts = binaries + "fonts"
@@ -130,23 +636,194 @@ def configure_font_subtitles_win(binaries):
     os.environ["FC_CONFIG_DIR"] = fonts
     os.environ["FC_CONFIG_FILE"] = fonts + os.sep + name
 
-    # Check the presence of fonts directory
-    if not os.path.exists(os.environ["FC_CONFIG_DIR"]):
-        os.mkdir(os.environ["FC_CONFIG_DIR"])
+    # Create the fonts directory and fonts.conf if they are not there yet
+    try:
+        os.stat(os.environ["FC_CONFIG_FILE"])
 
-    # Check the presence of fonts.conf
-    if not os.path.exists(os.environ["FC_CONFIG_FILE"]):
-        fc_config_file = open(os.environ["FC_CONFIG_FILE"], "wb")
-        fc_config_file.write(
-            "<fontconfig><dir>C:\\WINDOWS\\Fonts</dir></fontconfig>".encode("utf-8")
-        )
-        fc_config_file.close()
+    except FileNotFoundError:
+        os.makedirs(os.environ["FC_CONFIG_DIR"], exist_ok=True)
+
+        with open(os.environ["FC_CONFIG_FILE"], "wb") as fc_config_file:
+            fc_config_file.write(
+                b"<fontconfig><dir>C:\\WINDOWS\\Fonts</dir></fontconfig>"
+            )
+
+    _FONTS_CONFIGURED = True
+
+
+# Extensions that are known without having to probe the file
+_VIDEO_AUDIO_EXTENSIONS = frozenset(
+    {
+        ".3gp",
+        ".aac",
+        ".avi",
+        ".flac",
+        ".flv",
+        ".m2ts",
+        ".m4a",
+        ".m4v",
+        ".mka",
+        ".mkv",
+        ".mov",
+        ".mp3",
+        ".mp4",
+        ".mpeg",
+        ".mpg",
+        ".ogg",
+        ".opus",
+        ".ts",
+        ".wav",
+        ".webm",
+        ".wma",
+        ".wmv",
+    }
+)
+# Subtitles, images and other files usually found next to the videos
+_EXCLUDED_EXTENSIONS = frozenset(
+    {
+        ".ass",
+        ".avif",
+        ".bmp",
+        ".db",
+        ".gif",
+        ".heic",
+        ".heif",
+        ".idx",
+        ".ini",
+        ".jpeg",
+        ".jpg",
+        ".mks",
+        ".nfo",
+        ".png",
+        ".smi",
+        ".srt",
+        ".ssa",
+        ".sub",
+        ".sup",
+        ".txt",
+        ".vtt",
+        ".webp",
+    }
+)
+
+
+# Container signatures, as (offset, magic bytes), found in the file header
+_MEDIA_SIGNATURES = (
+    (0, b"\x1a\x45\xdf\xa3"),  # Matroska / WebM
+    (4, b"ftyp"),  # MP4 / MOV / 3GP / M4A
+    (4, b"moov"),  # Old QuickTime
+    (4, b"mdat"),  # Old QuickTime
+    (8, b"AVI "),  # RIFF AVI
+    (8, b"WAVE"),  # RIFF WAV
+    (0, b"OggS"),  # Ogg / Opus
+    (0, b"fLaC"),  # FLAC
+    (0, b"FLV\x01"),  # Flash video
+    (0, b"ID3"),  # MP3 with ID3 tag
+    (0, b"\xff\xfb"),  # MP3 frame
+    (0, b"\xff\xf1"),  # AAC ADTS
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"),  # ASF / WMV / WMA
+    (0, b"\x00\x00\x01\xba"),  # MPEG program stream
+    (0, b"\x00\x00\x01\xb3"),  # MPEG video
+)
+_HEADER_SIZE = 32
+
+# ISO base media brands of still images, they share the "ftyp" box with MP4
+_IMAGE_BRANDS = frozenset(
+    {b"avif", b"avis", b"heic", b"heix", b"heim", b"mif1", b"msf1"}
+)
+
+
+def _sniff_header(file_path: str) -> bool:
+    """
+    Check if the header of the given file starts like a known media container.
+
+    :param file_path: str, The path to the file to be checked.
+
+    :return: bool, True if a known signature was found, False otherwise.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(_HEADER_SIZE)
+    except OSError:
+        return False
+
+    if head[4:8] == b"ftyp" and head[8:12] in _IMAGE_BRANDS:
+        return False
+
+    return any(head.startswith(magic, offset) for offset, magic in _MEDIA_SIGNATURES)
+
+
+@lru_cache(maxsize=4096)
+def _probe_is_video_or_audio(file_path: str, size: int, mtime_ns: int) -> bool:
+    """
+    Check with ffprobe if the given file has an audio or video stream, so the
+    subtitle only containers that ffprobe can read are not taken as media.
+
+    The probe goes through the ffprobe cache, so the readable files are not
+    probed again in later runs, and its streams are reused by the jobs. The
+    size and modification time are only part of the in-memory cache key, so
+    the files ffprobe cannot read are only probed again if they change.
+
+    :param file_path: str, The path to the file to be checked.
+    :param size: int, The size of the file in bytes.
+    :param mtime_ns: int, The modification time of the file in nanoseconds.
+
+    :return: bool, True if ffprobe finds an audio or video stream, False
+        otherwise, or if ffprobe is not installed.
+    """
+    return any(
+        stream.get("codec_type") in ("audio", "video")
+        for stream in probe(file_path).get("streams", [])
+    )
+
+
+def _probe_file(file_path: str) -> bool:
+    """
+    Check if the given file is a video or audio file from its header, and only
+    ask ffprobe when the header is not recognized. The ffprobe result is cached
+    until the file changes.
+
+    :param file_path: str, The path to the file to be checked.
+
+    :return: bool, True if the file is a video or audio file, False otherwise.
+    """
+    if _sniff_header(file_path):
+        return True
+
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+
+    return _probe_is_video_or_audio(file_path, stat.st_size, stat.st_mtime_ns)
+
+
+def _check_extension(file_path: str) -> bool | None:
+    """
+    Check if the given file is a video or audio file from its extension alone.
+
+    :param file_path: str, The path to the file to be checked.
+
+    :return: bool | None, True or False for known extensions, None otherwise.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in _EXCLUDED_EXTENSIONS:
+        return False
+
+    if extension in _VIDEO_AUDIO_EXTENSIONS:
+        return True
+
+    return None
 
 
 def is_video_or_audio_file(file_path: Path | str) -> bool:
     """
     Check if the given file is a video or audio file.
 
+    Known extensions are answered right away, files with unknown extensions
+    are recognized by their header, and ffprobe is only spawned when both fail.
+
     :param file_path: Path | str, The path to the file to be checked.
 
     :return: bool, True if the file is a video or audio file, False otherwise.
@@ -154,43 +831,129 @@ def is_video_or_audio_file(file_path: Path | str) -> bool:
 
     file_path = str(file_path)
 
-    excluded_extensions = (".srt", ".jpg", ".png", ".jpeg", ".gif", ".bmp")
+    is_video_or_audio = _check_extension(file_path)
 
-    if file_path.endswith(excluded_extensions):
-        return False
+    if is_video_or_audio is None:
+        return _probe_file(file_path)
 
-    try:
-        if os.name == "nt":
-            # Option 1: Hide console window using startupinfo
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            subprocess.run(
-                ["ffprobe", file_path],
-                startupinfo=startupinfo,
-                check=True,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
+    return is_video_or_audio
+
+
+def classify_video_or_audio_files(
+    file_paths: Iterable[Path | str],
+) -> Dict[str, bool]:
+    """
+    Check which of the given files are video or audio files, in one batch.
+
+    The files are first classified by extension, then the remaining ones are
+    sniffed by header and probed concurrently, with up to one ffprobe process
+    per CPU (capped at _MAX_WORKERS) at the same time.
 
-            # Option 2: Hide console window using creationflags
-            # subprocess.run(["ffprobe", file_path], creationflags=subprocess.CREATE_NO_WINDOW)
+    :param file_paths: Iterable[Path | str], The paths to the files to be checked.
 
+    :return: Dict[str, bool], Maps each path, as a str, to True if it's a video
+        or audio file, False otherwise.
+    """
+    classified: Dict[str, bool] = {}
+    unknown: List[str] = []
+
+    for file_path in map(str, file_paths):
+        is_video_or_audio = _check_extension(file_path)
+
+        if is_video_or_audio is None:
+            unknown.append(file_path)
         else:
-            subprocess.run(
-                ["ffprobe", file_path],
-                check=True,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
+            classified[file_path] = is_video_or_audio
 
-        return True
+    if unknown:
+        with ThreadPoolExecutor(
+            max_workers=min(_MAX_WORKERS, len(unknown))
+        ) as executor:
+            classified.update(zip(unknown, executor.map(_probe_file, unknown)))
+
+    return classified
+
+
+def _walk_files(root: str) -> Iterator[str]:
+    """
+    Recursively yield the files under root, skipping the excluded extensions.
+
+    os.scandir entries carry the file type, so no extra stat call is needed
+    to tell files from directories.
+
+    :param root: str, The directory to walk.
+
+    :return: Iterator[str], The paths of the files.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path)
 
-    except subprocess.CalledProcessError:
+            elif entry.is_file() and _check_extension(entry.name) is not False:
+                yield entry.path
+
+
+def probe_streams(file_path: Path | str) -> List[dict]:
+    """
+    Get the streams of the given media file with a single, cached, ffprobe run.
+
+    :param file_path: Path | str, The path to the media file.
+
+    :return: List[dict], The streams as reported by "ffprobe -show_streams",
+        or an empty list if the file cannot be probed.
+    """
+    return probe(file_path).get("streams", [])
+
+
+# Audio codecs each output container can hold, so they can be copied into it
+_CONTAINER_AUDIO_CODECS = {
+    ".aac": frozenset({"aac"}),
+    ".avi": frozenset({"ac3", "mp3", "pcm_s16le"}),
+    ".flac": frozenset({"flac"}),
+    ".m4a": frozenset({"aac", "alac"}),
+    ".mka": frozenset(
+        {"aac", "ac3", "dts", "eac3", "flac", "mp3", "opus", "pcm_s16le", "vorbis"}
+    ),
+    ".mkv": frozenset(
+        {"aac", "ac3", "dts", "eac3", "flac", "mp3", "opus", "pcm_s16le", "vorbis"}
+    ),
+    ".mov": frozenset({"aac", "ac3", "alac", "mp3", "pcm_s16le"}),
+    ".mp3": frozenset({"mp3"}),
+    ".mp4": frozenset({"aac", "ac3", "alac", "eac3", "mp3"}),
+    ".ogg": frozenset({"flac", "opus", "vorbis"}),
+    ".opus": frozenset({"opus"}),
+    ".wav": frozenset({"pcm_s16le"}),
+    ".webm": frozenset({"opus", "vorbis"}),
+}
+
+
+def audio_fits_container(file_path: Path | str, extension: str) -> bool:
+    """
+    Check if the audio of the given media file can be copied as it is into a
+    container with the given extension, without re-encoding it.
+
+    :param file_path: Path | str, The path to the media file.
+    :param extension: str, The extension of the output file, like ".mp4".
+
+    :return: bool, True if the file has audio and every audio stream is in a
+        codec the container can hold, False otherwise.
+    """
+    container_codecs = _CONTAINER_AUDIO_CODECS.get(extension.lower())
+
+    if not container_codecs:
         return False
 
+    audio_codecs = [
+        stream.get("codec_name")
+        for stream in probe_streams(file_path)
+        if stream.get("codec_type") == "audio"
+    ]
+
+    return bool(audio_codecs) and all(
+        codec in container_codecs for codec in audio_codecs
+    )
+
 
 def extract_subtitle(
     video_file: Path, destiny_folder: Path, target_subtitle_extension: str = ".srt"
@@ -204,87 +967,135 @@ def extract_subtitle(
 
     :return: list[Path], The paths to the extracted subtitle files, or None if extraction fails.
     """
-    output_files: List[Path] = []
+    try:
+        subtitle_streams = [
+            stream
+            for stream in probe_streams(video_file)
+            if stream.get("codec_type") == "subtitle"
+        ]
 
-    startupinfo = subprocess.STARTUPINFO()
-    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        if not subtitle_streams:
+            return []
 
-    try:
-        # Extract the subtitle tracks
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "s",
-                "-show_entries",
-                "stream=index",
-                "-of",
-                "default=nokey=1:noprint_wrappers=1",
-                f"{str(video_file)}",
-            ],
-            startupinfo=startupinfo,
-            check=False,
-            capture_output=True,
-            text=True,
+        # A single ffmpeg run writes every subtitle track, so the video is only
+        # demuxed once instead of once per track
+        extract_command = ["ffmpeg", "-y", "-i", os.fspath(video_file)]
+
+        destiny = os.fspath(destiny_folder)
+        stem = video_file.stem
+        output_paths: List[str] = []
+
+        for i, stream in enumerate(subtitle_streams):
+            # Untitled tracks are named after their position, so they don't collide
+            title = stream.get("tags", {}).get("title") or str(i)
+
+            output_file = os.path.join(
+                destiny, f"{stem}_NAME={title}{target_subtitle_extension}"
+            )
+            extract_command.extend(["-map", f"0:s:{i}", output_file])
+            output_paths.append(output_file)
+
+        subprocess.run(
+            extract_command,
+            check=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATION_FLAGS,
         )
 
-        subtitle_tracks = [
-            line.strip() for line in result.stdout.split("\n") if line.strip()
-        ]
+        return [Path(output_file) for output_file in output_paths]
+
+    # ffmpeg failed, or is not installed
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _convert_one_subtitle(
+    input_subtitle_file: Path,
+    destiny_folder: Path,
+    target_subtitle_extension: str,
+    semaphore: asyncio.Semaphore,
+) -> Path:
+    """
+    Convert a single subtitle file to the target format.
+
+    :param input_subtitle_file: Path, The path to the subtitle file.
+    :param destiny_folder: Path, The folder where the converted file will be saved.
+    :param target_subtitle_extension: str, The extension of the converted file.
+    :param semaphore: asyncio.Semaphore, Limits how many ffmpeg run at the same time.
+
+    :raises subprocess.CalledProcessError: If the ffmpeg command fails.
+    :raises OSError: If ffmpeg cannot be run.
+
+    :return: Path, The path to the converted file.
+    """
+    input_subtitle = os.fspath(input_subtitle_file)
+
+    target_subtitle = os.path.join(
+        os.fspath(destiny_folder),
+        os.path.splitext(os.path.basename(input_subtitle))[0]
+        + target_subtitle_extension,
+    )
 
-        subtitle_titles_result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "s",
-                "-show_entries",
-                "stream_tags=title",
-                "-of",
-                "default=nokey=1:noprint_wrappers=1",
-                f"{str(video_file)}",
-            ],
-            check=False,
-            capture_output=True,
-            text=True,
+    if os.path.exists(target_subtitle):
+        os.remove(target_subtitle)
+
+    # Each ffmpeg uses a single thread, the files are converted in parallel
+    convert_command = [
+        "ffmpeg",
+        "-i",
+        input_subtitle,
+        "-threads",
+        "1",
+        target_subtitle,
+        "-y",
+    ]
+
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *convert_command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATION_FLAGS,
         )
+        return_code = await process.wait()
 
-        subtitle_titles = [
-            line.strip() for line in subtitle_titles_result.stdout.split("\n")
-        ]
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, convert_command)
 
-        subtitle_titles = list(filter(None, subtitle_titles))
+    return Path(target_subtitle)
 
-        for i, track in enumerate(subtitle_tracks):
-            output_file = (
-                destiny_folder
-                / f"{video_file.stem}_NAME={subtitle_titles[i]}{target_subtitle_extension}"
-            )
-            extract_command = [
-                "ffmpeg",
-                "-i",
-                f"{str(video_file)}",
-                "-map",
-                f"0:s:{track}",
-                f"{str(output_file)}",
-                "-y",
-            ]
-            subprocess.run(
-                extract_command,
-                check=True,
-                startupinfo=startupinfo,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            output_files.append(output_file)
 
-        return output_files
+async def _convert_subtitles(
+    input_subtitle_files: List[Path],
+    destiny_folder: Path,
+    target_subtitle_extension: str,
+) -> List[Path]:
+    """
+    Convert the given subtitle files concurrently, see convert_subtitle.
 
-    except subprocess.CalledProcessError:
-        return None
+    :raises subprocess.CalledProcessError: If one of the ffmpeg commands fails.
+    :raises OSError: If ffmpeg cannot be run.
+
+    :return: List[Path], The paths to the converted files.
+    """
+    semaphore = asyncio.Semaphore(_MAX_WORKERS)
+
+    return list(
+        await asyncio.gather(
+            *(
+                _convert_one_subtitle(
+                    input_subtitle_file,
+                    destiny_folder,
+                    target_subtitle_extension,
+                    semaphore,
+                )
+                for input_subtitle_file in input_subtitle_files
+            )
+        )
+    )
 
 
 def convert_subtitle(
@@ -293,49 +1104,22 @@ def convert_subtitle(
     target_subtitle_extension: str,
 ) -> List[Path] | None:
     """
-    Convert the given subtitle file to target format.
+    Convert the given subtitle files to target format, running up to
+    _MAX_WORKERS ffmpeg processes at the same time.
 
     :param input_subtitles_files: List[Path], The path to the subtitle file.
 
-    :return: List[Path], The path to the converted file, or None.
+    :return: List[Path], The path to the converted file, or None if ffmpeg
+        failed or is not installed.
     """
-    output_subtitle_file = []
-
     try:
-        for input_subtitle_file in input_subtitle_files:
-            target_subtitle = (
-                destiny_folder
-                / input_subtitle_file.with_suffix(target_subtitle_extension).name
-            )
-
-            if target_subtitle.exists():
-                target_subtitle.unlink()
-
-            convert_command = [
-                "ffmpeg",
-                "-i",
-                str(input_subtitle_file),
-                str(target_subtitle),
-                "-y",
-            ]
-
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            subprocess.run(
-                convert_command,
-                startupinfo=startupinfo,
-                check=True,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+        return asyncio.run(
+            _convert_subtitles(
+                input_subtitle_files, destiny_folder, target_subtitle_extension
             )
+        )
 
-            output_subtitle_file.append(target_subtitle)
-
-        return output_subtitle_file
-
-    except subprocess.CalledProcessError:
+    except (OSError, subprocess.CalledProcessError):
         return None
 
 
@@ -347,69 +1131,29 @@ def ffmpeg_info_extractor(
 
     :param input_file: Path, The path to the input file.
 
-    :return: str, The video information, or None if extraction fails.
+    :return: The subtitle titles, and the audio indexes and languages. They are
+        empty if the file cannot be probed or ffprobe is not installed.
     """
 
-    subtitle_titles_result = subprocess.run(
-        [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "s",
-            "-show_entries",
-            "stream_tags=title",
-            "-of",
-            "default=nokey=1:noprint_wrappers=1",
-            f"{str(input_file)}",
-        ],
-        check=False,
-        capture_output=True,
-        text=True,
-    )
-
-    subtitle_titles = [
-        line.strip() for line in subtitle_titles_result.stdout.split("\n")
-    ]
-
-    subtitle_titles = list(filter(None, subtitle_titles))
+    subtitle_titles: List[str] = []
+    audio_index: List[str] = []
+    audio_name: List[str] = []
 
-    audio_track_result = subprocess.run(
-        [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "a",
-            "-show_entries",
-            "stream=index:stream_tags=language",
-            "-of",
-            "default=noprint_wrappers=1",
-            f"{str(input_file)}",
-        ],
-        check=False,
-        capture_output=True,
-        text=True,
-    )
+    for stream in probe_streams(input_file):
+        codec_type = stream.get("codec_type")
+        tags = stream.get("tags", {})
 
-    audio_tracks = [
-        line.strip() for line in audio_track_result.stdout.split("\n") if line.strip()
-    ]
+        if codec_type == "subtitle" and tags.get("title"):
+            subtitle_titles.append(tags["title"])
 
-    audio_name: List[str] = []
-    audio_index: List[str] = []
-    for i, audio_track in enumerate(audio_tracks):
-        if i % 2 == 0:
-            audio_index.append(str(audio_track).replace("index=", ""))
-        else:
-            audio_name.append(str(audio_track).replace("TAG:", ""))
+        elif codec_type == "audio":
+            audio_index.append(str(stream["index"]))
+            audio_name.append(tags.get("language", ""))
 
     return subtitle_titles, (audio_index, audio_name)
 
 
 if __name__ == "__main__":
-    import sys
-
     sys.path.append(os.getcwd())
 
     from video_adjuster import VideoAdjuster
@@ -422,6 +1166,9 @@ if __name__ == "__main__":
             configure_font_subtitles_win(binaries_)
 
         # Merge the subtitles with the video
-        for root, dirs, files in os.walk(os.getcwd()):
-            video_adjuster = VideoAdjuster(files)
+        classified = classify_video_or_audio_files(_walk_files(os.getcwd()))
+        videos = [path for path, is_video in classified.items() if is_video]
+
+        if videos:
+            video_adjuster = VideoAdjuster(videos)
             video_adjuster.merge_video_to_subtitle("pt_BR")
@@ -0,0 +1,192 @@
+"""
+This module contains a persistent cache for ffprobe results, so the same file
+is not probed again across runs unless it changes.
+"""
+
+import json
+import os
+from pathlib import Path
+import sqlite3
+import subprocess
+from threading import Lock
+
+from utils.json_utils import json_loads
+
+FFPROBE_CACHE_PATH = "settings/ffprobe_cache.sqlite3"
+
+# Hide the console window of the spawned ffmpeg/ffprobe processes on windows
+CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+
+# ffprobe arguments, the path of the probed file is appended to them
+_PROBE_JSON = (
+    "ffprobe",
+    "-v",
+    "error",
+    "-print_format",
+    "json",
+    "-show_streams",
+    "-show_format",
+)
+
+_memory_cache: dict[str, dict] = {}
+_connection: sqlite3.Connection | None = None
+_lock = Lock()
+
+# Set when the cache database cannot be opened, like in a read-only settings
+# folder, the results are then only cached in memory
+_disk_cache_failed = False
+
+
+def _get_connection() -> sqlite3.Connection | None:
+    """
+    Opens the cache database on first use, creating the table if needed.
+
+    :return: sqlite3.Connection | None, The connection shared by all threads,
+        None if the database cannot be opened.
+    """
+    global _connection, _disk_cache_failed
+
+    if _connection is None and not _disk_cache_failed:
+        try:
+            connection = sqlite3.connect(FFPROBE_CACHE_PATH, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS probe_cache "
+                "(key TEXT PRIMARY KEY, json TEXT)"
+            )
+
+        except sqlite3.Error:
+            _disk_cache_failed = True
+
+        else:
+            _connection = connection
+
+    return _connection
+
+
+def _read_disk_cache(key: str) -> str | None:
+    """
+    Reads the cached ffprobe output of the given key from the database.
+
+    :param key: str, The cache key of the file.
+
+    :return: str | None, The JSON, None if it's not cached or the database
+        cannot be read.
+    """
+    with _lock:
+        connection = _get_connection()
+
+        if connection is None:
+            return None
+
+        try:
+            row = connection.execute(
+                "SELECT json FROM probe_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+        except sqlite3.Error:
+            return None
+
+    return row[0] if row else None
+
+
+def _write_disk_cache(key: str, info: dict) -> None:
+    """
+    Stores the ffprobe output of the given key in the database, the write is
+    skipped if the database cannot be written.
+
+    :param key: str, The cache key of the file.
+    :param info: dict, The ffprobe output.
+
+    :return: None.
+    """
+    with _lock:
+        connection = _get_connection()
+
+        if connection is None:
+            return
+
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO probe_cache (key, json) VALUES (?, ?)",
+                (key, json.dumps(info)),
+            )
+            connection.commit()
+
+        except sqlite3.Error:
+            pass
+
+
+def _run_ffprobe(file_path: str) -> dict:
+    """
+    Runs ffprobe on the given file and parses its JSON output.
+
+    :param file_path: str, The path to the media file.
+
+    :return: dict, The streams and format of the file, or an empty dict if the
+        file cannot be probed or ffprobe cannot be run.
+    """
+    # The output is parsed straight from the pipe bytes, without decoding it
+    # into an intermediate str
+    try:
+        with subprocess.Popen(
+            [*_PROBE_JSON, file_path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATION_FLAGS,
+        ) as process:
+            assert process.stdout is not None
+            output = process.stdout.read()
+
+    # ffprobe is not installed
+    except OSError:
+        return {}
+
+    if process.returncode != 0:
+        return {}
+
+    try:
+        return json_loads(output)
+    except ValueError:
+        return {}
+
+
+def probe(file_path: Path | str) -> dict:
+    """
+    Get the ffprobe information of the given media file.
+
+    The result is cached in memory and on disk, keyed on the path, size and
+    modification time of the file. Failed probes are not cached, and the cache
+    is only kept in memory when its database cannot be used.
+
+    :param file_path: Path | str, The path to the media file.
+
+    :return: dict, The "streams" and "format" reported by ffprobe, or an empty
+        dict if the file cannot be probed.
+    """
+    file_path = os.path.abspath(file_path)
+
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return {}
+
+    key = f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    if key in _memory_cache:
+        return _memory_cache[key]
+
+    cached_json = _read_disk_cache(key)
+
+    if cached_json:
+        info = json_loads(cached_json)
+        _memory_cache[key] = info
+        return info
+
+    info = _run_ffprobe(file_path)
+
+    if info:
+        _memory_cache[key] = info
+        _write_disk_cache(key, info)
+
+    return info
@@ -2,13 +2,22 @@
 This module contains utility functions for loading and saving user settings.
 """
 
+from functools import lru_cache
 import json
 from typing import Literal, Tuple
 
+# orjson is optional, it parses the translations and the ffprobe output faster
+# when installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 TRANSLATIONS_PATH = "settings/translations.json"
 USER_SETTINGS = "settings/user_settings.json"
 
 
+@lru_cache(maxsize=1)
 def load_last_used_settings() -> Tuple[
     Literal["pt_BR", "en_US"],
     Literal["default", "black"],
@@ -16,6 +25,7 @@ def load_last_used_settings() -> Tuple[
 ]:
     """
     Loads the last used theme and language from the user_settings.json file.
+    The file is only read again after save_last_used_settings updates it.
 
     :return: A tuple containing the last used theme, language and app.
     """
@@ -27,8 +37,6 @@ def load_last_used_settings() -> Tuple[
 
         app = user_settings["last_used_app"]
 
-    f.close()
-
     return language, theme, app
 
 
@@ -48,28 +56,33 @@ def save_last_used_settings(
     :return: None.
     """
 
-    with open(USER_SETTINGS, "r", encoding="utf-8") as f:
+    with open(USER_SETTINGS, "r+", encoding="utf-8") as f:
         user_settings = json.load(f)
 
-    if key == "last_used_language" and language is not None:
-        user_settings["last_used_language"] = language
+        if key == "last_used_language" and language is not None:
+            user_settings["last_used_language"] = language
 
-    if key == "last_used_theme" and theme is not None:
-        user_settings["last_used_theme"] = theme
+        if key == "last_used_theme" and theme is not None:
+            user_settings["last_used_theme"] = theme
 
-    user_settings["last_used_app"] = used_app
+        user_settings["last_used_app"] = used_app
 
-    with open(USER_SETTINGS, "w", encoding="utf-8") as f:
+        f.seek(0)
+        f.truncate()
         json.dump(user_settings, f, indent=4)
 
+    load_last_used_settings.cache_clear()
+
 
+@lru_cache(maxsize=1)
 def load_translations() -> dict:
     """
     Loads the translations from the translations.json file.
+    The file is parsed once, the same dictionary is returned on every call.
 
     :return: A dictionary containing the translations.
     """
-    with open(TRANSLATIONS_PATH, "r", encoding="utf-8") as translation:
-        language_translation = json.load(translation)
+    with open(TRANSLATIONS_PATH, "rb") as translation:
+        language_translation = json_loads(translation.read())
 
     return language_translation
@@ -4,6 +4,54 @@ This module contains utility functions for working with tkinter windows.
 
 import tkinter as tk
 
+# The screen size doesn't change while the app is running, it's queried once
+_SCREEN_SIZE: tuple[int, int] | None = None
+
+
+def _forget_master_geometry(master: tk.Tk | tk.Toplevel) -> None:
+    """
+    Drops the cached geometry of the given master window.
+
+    :param master: The master window.
+
+    :return: None.
+    """
+    master._cached_geom = None
+
+
+def _master_geometry(master: tk.Tk | tk.Toplevel) -> tuple[int, int, int, int]:
+    """
+    Get the position and size of the given master window, only querying the
+    window system again after the master was moved or resized.
+
+    The geometry is kept on the master itself, so a new window reusing the
+    path of a destroyed one doesn't inherit its geometry.
+
+    :param master: The master window.
+
+    :return: tuple[int, int, int, int], The x, y, width and height of the master.
+    """
+    geometry = getattr(master, "_cached_geom", None)
+
+    if geometry is None:
+        geometry = (
+            master.winfo_x(),
+            master.winfo_y(),
+            master.winfo_width(),
+            master.winfo_height(),
+        )
+        master._cached_geom = geometry
+
+        if not getattr(master, "_cached_geom_bound", False):
+            master._cached_geom_bound = True
+            master.bind(
+                "<Configure>",
+                lambda _: _forget_master_geometry(master),
+                add="+",
+            )
+
+    return geometry
+
 
 def center_window(
     window: tk.Tk | tk.Toplevel, master: tk.Tk | tk.Toplevel | None = None
@@ -18,20 +66,28 @@ def center_window(
     :return: None.
     """
 
+    global _SCREEN_SIZE
+
+    # update_idletasks flushes the pending layout of the whole application,
+    # so the master geometry is up to date after this call too
     window.update_idletasks()
     window_width = window.winfo_reqwidth()
     window_height = window.winfo_reqheight()
 
-    screen_width = window.winfo_screenwidth()
-    screen_height = window.winfo_screenheight()
+    if master:
+        master_x, master_y, master_width, master_height = _master_geometry(master)
 
-    x = (screen_width - window_width) / 2
-    y = (screen_height - window_height) / 2
+        x = master_x + (master_width - window_width) / 2
+        y = master_y + (master_height - window_height) / 2
 
-    if master:
-        master.update_idletasks()
-        x = master.winfo_x() + (master.winfo_width() - window_width) / 2
-        y = master.winfo_y() + (master.winfo_height() - window_height) / 2
+    else:
+        if _SCREEN_SIZE is None:
+            _SCREEN_SIZE = (window.winfo_screenwidth(), window.winfo_screenheight())
+
+        screen_width, screen_height = _SCREEN_SIZE
+
+        x = (screen_width - window_width) / 2
+        y = (screen_height - window_height) / 2
 
     window.geometry(f"{window_width}x{window_height}+{int(x)}+{int(y)}")
 
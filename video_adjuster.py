@@ -2,27 +2,90 @@
 This module contains a application for changing the title of video files to their filenames.
 """
 
+import codecs
+from concurrent.futures import Future, ThreadPoolExecutor
+import mmap
 import os
 from pathlib import Path
+import re
+import shutil
 import threading
 import tkinter as tk
 from tkinter import TclError, messagebox
-from typing import List
+from typing import Callable, Iterable, List, Tuple, TypeVar
 
-from ffmpeg_progress_yield import FfmpegProgress
-import chardet
+# cchardet is optional, its detection runs in C and is much faster than chardet
+try:
+    import cchardet as chardet
+except ImportError:
+    import chardet
 
-from app.tk_progress_bar import CustomProgressBar
+from app.tk_progress_bar import MAX_JOBS, CustomProgressBar
 
-from utils.threading_utils import CustomThread
 from utils.json_utils import (
     load_translations,
     load_last_used_settings,
 )
 from utils.ffmpeg_utils import (
-    is_video_or_audio_file,
+    FfmpegPipeProgress,
+    audio_fits_container,
+    classify_video_or_audio_files,
+    mkvmerge_subtitle_command,
+    set_title_in_place,
+    video_encoder_args,
 )
 
+# Subtitles are fed to the encoding detector in chunks, up to a maximum size
+DETECT_CHUNK_SIZE = 8 * 1024
+DETECT_MAX_READ = 64 * 1024
+
+# Below this confidence the detector's guess is dropped for the fallback, the
+# usual encoding of subtitles made on western windows machines
+DETECT_MIN_CONFIDENCE = 0.5
+DETECT_FALLBACK_ENCODING = "cp1252"
+
+# Confidence needed to leave a file that is not valid UTF-8 as it is, when the
+# detector still reads it as UTF-8
+DETECT_UTF8_CONFIDENCE = 0.9
+
+# Size of the chunks copied when a subtitle is rewritten as UTF-8
+REWRITE_CHUNK_SIZE = 64 * 1024
+
+# Byte order marks, the UTF-32 ones must be checked before UTF-16
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# ffmpeg and mkvmerge read these subtitles as they are, ASCII and UTF-8 files
+# and the ones starting with a UTF-8 or UTF-16 BOM
+_NATIVE_SUBTITLE_ENCODINGS = frozenset({"ascii", "utf-8", "utf-8-sig", "utf-16"})
+
+# Encodings that libavformat cannot convert, these subtitles are still rewritten
+# as UTF-8 before the merge
+_REWRITE_SUBTITLE_ENCODINGS = ("iso2022", "hz", "utf-32")
+
+# Characters removed from the file paths by simplify_file_path
+_QUOTE_CHARACTERS = str.maketrans("", "", "\"',")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Runs the job batches off the Tk thread, its threads are reused between batches
+_EXECUTOR = ThreadPoolExecutor(thread_name_prefix="video_adjuster")
+
+# Matches the first byte that is not ASCII
+_NON_ASCII = re.compile(rb"[\x80-\xff]")
+
+# Matches the escape byte of ISO-2022 and the shift sequence of HZ
+_SEVEN_BIT_ESCAPE = re.compile(rb"\x1b|~\{")
+
+# Each thread reuses its detector instead of allocating a new one per file
+_detector_local = threading.local()
+
 # language = load_last_used_settings()[0]
 # self.json_translations = load_translations()[language]
 
@@ -35,39 +98,229 @@ def simplify_file_path(file_path: Path | str) -> str:
 
     :return: str, The simplified file path.
     """
-    file_path = str(file_path)
-    return file_path.replace('"', "").replace("'", "").replace(",", "")
+    return str(file_path).translate(_QUOTE_CHARACTERS)
 
 
-def encode_subtitle_to_utf8(file_path: Path | str) -> str | None:
+def _output_key(file_path: Path | str) -> str:
     """
-    Encode the given file to UTF-8.
+    Normalizes an output path, so two paths to the same file compare equal.
 
-    :param file_path: Path | str, The path to the file to be encoded.
+    :param file_path: Path | str, The path to the output file.
+
+    :return: str, The absolute path, case folded on windows.
     """
-    file_path = str(file_path)
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def _parallel_map(function: Callable[..., T], *iterables: Iterable) -> List[T]:
+    """
+    Maps the given function over the iterables with up to MAX_JOBS threads.
+
+    :param function: Callable, The function to run.
+    :param iterables: Iterable, The arguments of each call.
+
+    :return: List, The results, in the order of the arguments.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_JOBS) as executor:
+        return list(executor.map(function, *iterables))
+
+
+def _parallel_submit(function: Callable[[T], R], items: Iterable[T]) -> List[Future]:
+    """
+    Runs the function on each item with up to MAX_JOBS threads, returning once
+    every call is done. Unlike _parallel_map, each call keeps its own exception.
+
+    :param function: Callable, The function to run.
+    :param items: Iterable, The argument of each call.
+
+    :return: List[Future], The finished calls, in the order of the items.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_JOBS) as executor:
+        return [executor.submit(function, item) for item in items]
+
+
+def _get_detector() -> chardet.UniversalDetector:
+    """
+    Returns this thread's encoding detector, reset and ready to be fed.
+
+    :return: chardet.UniversalDetector
+    """
+    detector = getattr(_detector_local, "detector", None)
+
+    if detector is None:
+        detector = chardet.UniversalDetector()
+        _detector_local.detector = detector
+    else:
+        detector.reset()
+
+    return detector
+
+
+def _is_utf8(mm: mmap.mmap, start: int) -> bool:
+    """
+    Checks if the mapped file is valid UTF-8 from the given offset to its end.
+
+    :param mm: mmap.mmap, The mapped file.
+    :param start: int, The offset to start from, it must not split a character.
+
+    :return: bool, True if every byte from start on is valid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    try:
+        for offset in range(start, len(mm), REWRITE_CHUNK_SIZE):
+            decoder.decode(mm[offset : offset + REWRITE_CHUNK_SIZE])
+
+        decoder.decode(b"", final=True)
+
+    except UnicodeDecodeError:
+        return False
+
+    return True
+
+
+def _detect_encoding(file_path: str) -> str:
+    """
+    Detects the encoding of the given file, feeding it to the detector in
+    chunks and stopping as soon as the detector is confident, or after
+    DETECT_MAX_READ bytes.
+
+    The file is memory mapped, so it's searched and sliced without reading it
+    into intermediate buffers. Files starting with a BOM, pure ASCII files and
+    valid UTF-8 files are recognized without running the detector, the 7 bit
+    ISO-2022 and HZ files still go through it.
+
+    :param file_path: str, The path to the file.
+
+    :raises FileNotFoundError: If the file does not exist.
+
+    :return: str, The detected encoding, DETECT_FALLBACK_ENCODING if the
+        detector is not confident enough.
+    """
+    with open(file_path, "rb") as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return "ascii"
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:4]
+
+            for bom, encoding in _BOMS:
+                if head.startswith(bom):
+                    return encoding
+
+            non_ascii = _NON_ASCII.search(mm)
+
+            if non_ascii is None:
+                # ISO-2022 and HZ are 7 bit encodings, only their escape
+                # sequences tell them apart from ASCII, which is valid UTF-8
+                if _SEVEN_BIT_ESCAPE.search(mm) is None:
+                    return "ascii"
+
+                start = 0
+
+            else:
+                # The ASCII text before the first non-ASCII byte tells the
+                # detector nothing, so it's fed from the chunk holding that byte
+                start = non_ascii.start() - non_ascii.start() % DETECT_CHUNK_SIZE
+
+                if _is_utf8(mm, start):
+                    return "utf-8"
+
+            end = min(len(mm), start + DETECT_MAX_READ)
+
+            detector = _get_detector()
+
+            for offset in range(start, end, DETECT_CHUNK_SIZE):
+                detector.feed(mm[offset : offset + DETECT_CHUNK_SIZE])
+
+                if detector.done:
+                    break
+
+    detector.close()
+
+    encoding = detector.result["encoding"]
+    confidence = detector.result["confidence"] or 0
 
-    json_translations = load_translations()[load_last_used_settings()[0]]
+    if encoding is None:
+        return DETECT_FALLBACK_ENCODING
+
+    # The file already failed the UTF-8 check, so an ascii or utf-8 guess means
+    # UTF-8 text with a few broken bytes. It's only trusted, and the rewrite
+    # skipped, when the detector is very confident
+    if encoding.lower() in ("ascii", "utf-8"):
+        if confidence >= DETECT_UTF8_CONFIDENCE:
+            return "utf-8"
+
+        return DETECT_FALLBACK_ENCODING
+
+    if confidence < DETECT_MIN_CONFIDENCE:
+        return DETECT_FALLBACK_ENCODING
+
+    return encoding
+
+
+def _rewrite_as_utf8(file_path: str, encoding: str) -> None:
+    """
+    Rewrites the given file as UTF-8, streaming it through a temporary file
+    in the same folder instead of holding the whole content in memory.
+
+    :param file_path: str, The path to the file.
+    :param encoding: str, The current encoding of the file.
+
+    :return: None.
+    """
+    temp_file_path = file_path + ".utf8.tmp"
 
     try:
-        with open(file_path, "rb") as f:
-            rawdata = f.read()
-            result = chardet.detect(rawdata)
-            encoding = result["encoding"]
+        if encoding.lower() == "utf-8-sig":
+            # Only the BOM has to go, the rest is copied byte by byte
+            with open(file_path, "rb") as src, open(temp_file_path, "wb") as dst:
+                src.seek(len(codecs.BOM_UTF8))
+                shutil.copyfileobj(src, dst, REWRITE_CHUNK_SIZE)
+
+        else:
+            with open(file_path, "r", encoding=encoding, newline="") as src, open(
+                temp_file_path, "w", encoding="utf-8", newline=""
+            ) as dst:
+                shutil.copyfileobj(src, dst, REWRITE_CHUNK_SIZE)
+
+        os.replace(temp_file_path, file_path)
+
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
 
-    except FileNotFoundError:
-        error_string = json_translations["MessageBox"][
-            "error_subtitle_not_found"
-        ].format(filename=Path(file_path).stem)
-        return error_string
 
-    with open(file_path, "r", encoding=encoding) as f:
-        content = f.read()
+def detect_subtitle_charenc(file_path: Path | str) -> str | None:
+    """
+    Get the encoding ffmpeg and mkvmerge must read the given subtitle with, so
+    it's converted while merging instead of being rewritten as UTF-8 first.
+
+    The rare encodings that libavformat cannot convert are still rewritten.
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    :param file_path: Path | str, The path to the subtitle file.
 
-    return None
+    :raises FileNotFoundError: If the file does not exist.
+    :raises LookupError: If Python has no codec for the detected encoding,
+        like EUC-TW or ISO-2022-CN.
+
+    :return: str | None, The encoding, None if the file can be read as it is.
+    """
+    file_path = str(file_path)
+
+    encoding = _detect_encoding(file_path)
+
+    codec_name = codecs.lookup(encoding).name
+
+    if codec_name in _NATIVE_SUBTITLE_ENCODINGS:
+        return None
+
+    if codec_name.startswith(_REWRITE_SUBTITLE_ENCODINGS):
+        _rewrite_as_utf8(file_path, encoding)
+        return None
+
+    return encoding
 
 
 # Todo: Add subtitle converter
@@ -90,26 +343,108 @@ class VideoAdjuster:
         self.total_files = len(input_files)
         self.master = master
 
-    def thread_function(
-        self, progress_bar_obj: CustomProgressBar, command: FfmpegProgress
-    ) -> threading.Thread:
+    def run_jobs(
+        self,
+        progress_bar_obj: CustomProgressBar,
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]],
+    ) -> List[bool | str | None]:
         """
-        A function to run a command in a separate thread.
+        Runs the jobs in a separate thread, a few of them at the same time,
+        while the progress bar mainloop is running.
 
         :param progress_bar_obj: ProgressBar, The progress bar object.
-        :param command: FfmpegProgress, The command to run in a separate thread.
+        :param jobs: List[Tuple[str, List[FfmpegPipeProgress]]], The label text
+            of each job and its commands, the next command is a fallback that is
+            only run if the previous one fails.
 
-        :return: threading.Thread
+        :return: List[bool | str | None], The result of each job.
         """
+        if not jobs:
+            return []
 
-        progress_thread = CustomThread(
-            target=progress_bar_obj.run_ffmpeg_with_progress, args=(command,)
+        return self.run_in_background(
+            progress_bar_obj, progress_bar_obj.run_ffmpeg_jobs_with_progress, jobs
         )
-        progress_thread.start()
 
-        progress_bar_obj.root.mainloop()
+    def run_in_background(
+        self,
+        progress_bar_obj: CustomProgressBar,
+        function: Callable[..., T],
+        *args,
+    ) -> T:
+        """
+        Runs the given function in the executor, keeping the progress bar
+        window responsive with its mainloop until the function returns.
+
+        :param progress_bar_obj: ProgressBar, The progress bar object.
+        :param function: Callable, The function to run.
+        :param args: The arguments of the function.
+
+        :return: The result of the function, its exception is re-raised.
+        """
+        future = _EXECUTOR.submit(function, *args)
+        root = progress_bar_obj.root
+
+        # The future is polled from the Tk thread, a quit from the worker
+        # thread could come before the mainloop starts and be lost
+        def quit_when_done() -> None:
+            nonlocal after_id
+
+            if future.done():
+                root.quit()
+            else:
+                after_id = root.after(50, quit_when_done)
+
+        after_id = root.after(0, quit_when_done)
+        root.mainloop()
+
+        # The mainloop may have been quit by the function itself, its next
+        # poll must not quit a later mainloop
+        try:
+            root.after_cancel(after_id)
+        except TclError:
+            pass
+
+        return future.result()
+
+    def show_results(
+        self,
+        progress_bar_obj: CustomProgressBar,
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]],
+        results: List[bool | str | None],
+    ) -> None:
+        """
+        Closes the progress bar and tells the user how the jobs went.
+
+        :param progress_bar_obj: ProgressBar, The progress bar object.
+        :param jobs: List[Tuple[str, List[FfmpegPipeProgress]]], The jobs that ran.
+        :param results: List[bool | str | None], The result of each job.
+
+        :return: None.
+        """
+        if progress_bar_obj.root:
+            try:
+                progress_bar_obj.root.destroy()
+            except TclError:
+                pass
 
-        return progress_thread
+        failed = [
+            message for (message, _), result in zip(jobs, results) if result == "error"
+        ]
+
+        if failed:
+            messagebox.showerror(
+                self.json_translations["MessageBox"]["error"],
+                message="\n".join(failed)
+                + "\n\n"
+                + self.json_translations["MessageBox"]["error_ffmpeg_command"],
+            )
+
+        elif False not in results:
+            messagebox.showinfo(
+                self.json_translations["MessageBox"]["success"],
+                message=self.json_translations["MessageBox"]["success_message"],
+            )
 
     def setup_progress_bar(self) -> CustomProgressBar:
         """
@@ -125,6 +460,59 @@ class VideoAdjuster:
 
         return progress_bar_obj
 
+    def confirm_overwrite(
+        self, progress_bar_obj: CustomProgressBar, output_files: List[str]
+    ) -> bool:
+        """
+        Asks the user, once for the whole batch, if the existing output files can
+        be overwritten.
+
+        :param progress_bar_obj: ProgressBar, The progress bar object.
+        :param output_files: List[str], The names of the existing output files.
+
+        :return: bool, True if the files can be overwritten.
+        """
+        message_box = self.json_translations["MessageBox"]
+
+        if len(output_files) == 1:
+            message = message_box["output_file_exists"].format(
+                output_file=output_files[0]
+            )
+        else:
+            message = message_box["output_files_exist"].format(
+                output_files="\n".join(output_files)
+            )
+
+        progress_bar_obj.root.withdraw()
+        overwrite = messagebox.askyesno(
+            message_box["warning"], message=message, parent=progress_bar_obj.root
+        )
+        progress_bar_obj.root.deiconify()
+
+        return overwrite
+
+    def warn_duplicate_outputs(
+        self, progress_bar_obj: CustomProgressBar, input_files: List[str]
+    ) -> None:
+        """
+        Tells the user which files were skipped because another file of the
+        batch writes the same output file.
+
+        :param progress_bar_obj: ProgressBar, The progress bar object.
+        :param input_files: List[str], The names of the skipped files.
+
+        :return: None.
+        """
+        message_box = self.json_translations["MessageBox"]
+
+        messagebox.showwarning(
+            message_box["warning"],
+            message=message_box["duplicate_output_files"].format(
+                input_files="\n".join(input_files)
+            ),
+            parent=progress_bar_obj.root,
+        )
+
     def run_converter(
         self,
         conversion_type: str = "video",
@@ -141,183 +529,207 @@ class VideoAdjuster:
         :return: None.
         """
 
-        progress_bar_obj = self.setup_progress_bar()
+        # Every output has the same extension, so its checks are made once for
+        # the whole batch. ffmpeg picks the format regardless of the case
+        output_suffix = output_extension.lower()
+        is_mp3 = output_suffix == ".mp3"
+        subtitle_codec = "mov_text" if output_suffix == ".mp4" else "srt"
 
-        success = True
-        for i, input_file in enumerate(self.input_files):
-            output_file = (
-                f"{self.output_folder}\\"
-                + f"{Path(input_file).name.replace(Path(input_file).suffix, output_extension)}"
+        if conversion_type == "video" and is_mp3:
+            messagebox.showerror(
+                self.json_translations["MessageBox"]["error"],
+                message=self.json_translations["MessageBox"]["error_convert_video_mp3"],
             )
+            return
+
+        progress_bar_obj = self.setup_progress_bar()
+
+        # The message templates are looked up once for the whole batch
+        converter_message = self.json_translations["ProgressBar"]["converter_message"]
+
+        # Only the video conversions can fall back to re-encoding the video
+        encoders_args: List[Tuple[List[str], List[str]]] = []
 
-            filename = Path(input_file).name
+        if conversion_type != "audio":
+            encoders_args = video_encoder_args()
 
-            message = self.json_translations["ProgressBar"]["converter_message"].format(
+        # The inputs are probed in parallel up front, off the Tk thread, the
+        # audio codec checks below and the progress of the jobs then read the
+        # cached results
+        copy_audio_flags = self.run_in_background(
+            progress_bar_obj,
+            _parallel_map,
+            audio_fits_container,
+            self.input_files,
+            [output_extension] * self.total_files,
+        )
+
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]] = []
+        existing_outputs: List[Tuple[int, str]] = []
+        seen_outputs: set[str] = set()
+        duplicate_inputs: List[str] = []
+        for i, (input_file, copy_audio) in enumerate(
+            zip(self.input_files, copy_audio_flags)
+        ):
+            input_path = Path(input_file)
+            filename = input_path.name
+
+            output_path = self.output_folder / (input_path.stem + output_extension)
+            output_file = os.fspath(output_path)
+
+            # The jobs run at the same time, so two inputs with the same name,
+            # like "a.mkv" and "a.avi", must not write the same output
+            output_key = _output_key(output_file)
+
+            if output_key in seen_outputs:
+                duplicate_inputs.append(filename)
+                continue
+
+            seen_outputs.add(output_key)
+
+            # Audio the output container can hold is copied, not re-encoded
+            audio_codec = "copy" if copy_audio else "aac"
+
+            message = converter_message.format(
                 filename=filename, current_file=i + 1, total_files=self.total_files
             )
 
-            progress_bar_obj.set_label_text(message, self.master)
-
             if conversion_type == "audio":
-                if not output_file.endswith(".mp3"):
-                    command = FfmpegProgress(
+                if not is_mp3:
+                    commands = [
+                        FfmpegPipeProgress(
+                            [
+                                "ffmpeg",
+                                "-i",
+                                input_file,
+                                "-vn",
+                                "-acodec",
+                                "aac",
+                                "-q:a",
+                                "0",
+                                output_file,
+                                "-y",
+                            ]
+                        ),
+                        FfmpegPipeProgress(
+                            [
+                                "ffmpeg",
+                                "-i",
+                                input_file,
+                                "-vn",
+                                "-acodec",
+                                "libvorbis",
+                                output_file,
+                                "-y",
+                            ]
+                        ),
+                    ]
+                else:
+                    commands = [
+                        FfmpegPipeProgress(
+                            [
+                                "ffmpeg",
+                                "-i",
+                                input_file,
+                                "-vn",
+                                "-acodec",
+                                "mp3",
+                                "-q:a",
+                                "0",
+                                output_file,
+                                "-y",
+                            ]
+                        )
+                    ]
+
+                if copy_audio:
+                    commands.insert(
+                        0,
+                        FfmpegPipeProgress(
+                            [
+                                "ffmpeg",
+                                "-i",
+                                input_file,
+                                "-vn",
+                                "-c:a",
+                                "copy",
+                                output_file,
+                                "-y",
+                            ]
+                        ),
+                    )
+
+            else:
+                commands = [
+                    FfmpegPipeProgress(
                         [
                             "ffmpeg",
                             "-i",
                             input_file,
-                            "-vn",
-                            "-acodec",
-                            "aac",
-                            "-q:a",
+                            "-c:v",
+                            "copy",
+                            "-c:a",
+                            "copy",
+                            "-c:s",
+                            subtitle_codec,
+                            "-map",
                             "0",
                             output_file,
                             "-y",
                         ]
-                    )
-
-                    command2 = FfmpegProgress(
+                    ),
+                    FfmpegPipeProgress(
                         [
                             "ffmpeg",
                             "-i",
                             input_file,
-                            "-vn",
-                            "-acodec",
-                            "libvorbis",
+                            "-c:v",
+                            "copy",
+                            "-c:a",
+                            audio_codec,
                             output_file,
                             "-y",
                         ]
-                    )
-                else:
-                    Path(output_file).unlink(missing_ok=True)
+                    ),
+                ]
 
-                    command = FfmpegProgress(
+                # Last resort, for a video codec the output container can't
+                # hold, NVENC is tried first when ffmpeg has it, then libx264
+                commands.extend(
+                    FfmpegPipeProgress(
                         [
                             "ffmpeg",
+                            *input_args,
                             "-i",
                             input_file,
-                            "-vn",
-                            "-acodec",
-                            "mp3",
-                            "-q:a",
-                            "0",
+                            *encoder_args,
+                            "-c:a",
+                            audio_codec,
                             output_file,
                             "-y",
                         ]
                     )
-
-                    command2 = None
-
-            elif conversion_type == "video":
-                if output_file.endswith(".mp3"):
-                    progress_bar_obj.root.destroy()
-                    messagebox.showerror(
-                        self.json_translations["MessageBox"]["error"],
-                        message=self.json_translations["MessageBox"][
-                            "error_convert_video_mp3"
-                        ],
-                    )
-                    success = False
-                    return
-
-                command = FfmpegProgress(
-                    [
-                        "ffmpeg",
-                        "-i",
-                        input_file,
-                        "-c:v",
-                        "copy",
-                        "-c:a",
-                        "copy",
-                        "-c:s",
-                        "mov_text" if output_file.endswith(".mp4") else "srt",
-                        "-map",
-                        "0",
-                        output_file,
-                        "-y",
-                    ]
+                    for input_args, encoder_args in encoders_args
                 )
 
-                command2 = FfmpegProgress(
-                    [
-                        "ffmpeg",
-                        "-i",
-                        input_file,
-                        "-c:v",
-                        "copy",
-                        "-c:a",
-                        "aac",
-                        output_file,
-                        "-y",
-                    ]
-                )
+            # A single lstat call, the outputs are overwritten by ffmpeg itself
+            if os.path.lexists(output_file):
+                existing_outputs.append((len(jobs), output_path.name))
 
-            if Path(output_file).exists():
-                progress_bar_obj.root.withdraw()
-                delete_file = messagebox.askyesno(
-                    self.json_translations["MessageBox"]["warning"],
-                    message=self.json_translations["MessageBox"][
-                        "output_file_exists"
-                    ].format(output_file=Path(output_file).name),
-                    parent=progress_bar_obj.root,
-                )
+            jobs.append((message, commands))
 
-                if delete_file:
-                    Path(output_file).unlink(missing_ok=True)
-                else:
-                    progress_bar_obj.root.deiconify()
-                    continue
+        if duplicate_inputs:
+            self.warn_duplicate_outputs(progress_bar_obj, duplicate_inputs)
 
-            progress_thread = self.thread_function(progress_bar_obj, command)
+        if existing_outputs and not self.confirm_overwrite(
+            progress_bar_obj, [name for _, name in existing_outputs]
+        ):
+            skipped = {index for index, _ in existing_outputs}
+            jobs = [job for index, job in enumerate(jobs) if index not in skipped]
 
-            return_value = progress_thread.join()
+        results = self.run_jobs(progress_bar_obj, jobs)
 
-            if not return_value:
-                progress_bar_obj.root.destroy()
-                success = False
-                break
-
-            if return_value == "error":
-                if command2:
-                    progress_bar_obj.root.deiconify()
-                    progress_thread = self.thread_function(progress_bar_obj, command2)
-
-                    return_value = progress_thread.join()
-
-                    if not return_value or return_value == "error":
-                        messagebox.showerror(
-                            self.json_translations["MessageBox"]["error"],
-                            message=message
-                            + "\n\n"
-                            + self.json_translations["MessageBox"][
-                                "error_ffmpeg_command"
-                            ],
-                        )
-                        progress_bar_obj.root.destroy()
-                        success = False
-                        break
-
-                else:
-                    messagebox.showerror(
-                        self.json_translations["MessageBox"]["error"],
-                        message=message
-                        + "\n\n"
-                        + self.json_translations["MessageBox"]["error_ffmpeg_command"],
-                    )
-                    progress_bar_obj.root.destroy()
-                    success = False
-                    break
-
-        if progress_bar_obj.root:
-            try:
-                progress_bar_obj.root.destroy()
-            except TclError:
-                pass
-
-        if success:
-            messagebox.showinfo(
-                self.json_translations["MessageBox"]["success"],
-                message=self.json_translations["MessageBox"]["success_message"],
-            )
+        self.show_results(progress_bar_obj, jobs, results)
 
     def change_video_title_to_filename(self) -> None:
         """
@@ -329,64 +741,72 @@ class VideoAdjuster:
 
         progress_bar_obj = self.setup_progress_bar()
 
-        success = True
-        for i, input_file in enumerate(self.input_files):
-            filename = Path(input_file).name
+        change_title_message = self.json_translations["ProgressBar"][
+            "change_title_message"
+        ]
+
+        input_paths = [Path(input_file) for input_file in self.input_files]
+
+        # Matroska and MP4 titles are edited in the file header when the tools
+        # are installed, the other files are copied by ffmpeg with the new title.
+        # AtomicParsley rewrites the whole file when it has no padding, so the
+        # edits run off the Tk thread
+        edited_in_place = self.run_in_background(
+            progress_bar_obj,
+            _parallel_map,
+            set_title_in_place,
+            self.input_files,
+            [input_path.stem for input_path in input_paths],
+        )
+
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]] = []
+        replaced_files: List[Tuple[str, str]] = []
+        for i, (input_file, input_path, edited) in enumerate(
+            zip(self.input_files, input_paths, edited_in_place)
+        ):
+            if edited:
+                continue
+
+            filename = input_path.name
 
-            title = Path(filename).stem
+            title = input_path.stem
 
-            temp_output_file = input_file.replace(filename, f"mod_{filename}")
+            temp_output_file = os.fspath(input_path.with_name(f"mod_{filename}"))
 
-            message = self.json_translations["ProgressBar"][
-                "change_title_message"
-            ].format(
+            message = change_title_message.format(
                 filename=filename, current_file=i + 1, total_files=self.total_files
             )
 
-            progress_bar_obj.set_label_text(message, self.master)
-
-            command = FfmpegProgress(
+            command = FfmpegPipeProgress(
                 [
                     "ffmpeg",
                     "-i",
                     input_file,
+                    "-map",
+                    "0",
                     "-c",
                     "copy",
                     "-metadata",
                     f"title={title}",
                     temp_output_file,
+                    "-y",
                 ],
             )
 
-            progress_thread = self.thread_function(progress_bar_obj, command)
+            jobs.append((message, [command]))
+            replaced_files.append((input_file, temp_output_file))
 
-            Path(input_file).unlink(missing_ok=True)
-            Path(temp_output_file).rename(input_file)
+        results = self.run_jobs(progress_bar_obj, jobs)
 
-            return_value = progress_thread.join()
-
-            if not return_value or return_value == "error":
-                messagebox.showerror(
-                    self.json_translations["MessageBox"]["error"],
-                    message=message
-                    + "\n\n"
-                    + self.json_translations["MessageBox"]["error_ffmpeg_command"],
-                )
-                progress_bar_obj.root.destroy()
-                success = False
-                break
+        # The original file is only replaced once its copy was written, the
+        # partial copies of the failed or cancelled files are removed
+        for (input_file, temp_output_file), result in zip(replaced_files, results):
+            if result is True:
+                os.replace(temp_output_file, input_file)
+            else:
+                Path(temp_output_file).unlink(missing_ok=True)
 
-        if progress_bar_obj.root:
-            try:
-                progress_bar_obj.root.destroy()
-            except TclError:
-                pass
-
-        if success:
-            messagebox.showinfo(
-                self.json_translations["MessageBox"]["success"],
-                message=self.json_translations["MessageBox"]["success_message"],
-            )
+        self.show_results(progress_bar_obj, jobs, results)
 
     def merge_video_to_subtitle(self, subtitle_language: str = "Pt-BR") -> None:
         """
@@ -402,57 +822,110 @@ class VideoAdjuster:
 
         progress_bar_obj = self.setup_progress_bar()
 
-        success = True
-        for i, input_file in enumerate(self.input_files):
+        merge_to_subtitle_message = self.json_translations["ProgressBar"][
+            "merge_to_subtitle_message"
+        ]
 
-            # Get rid of quote characters
-            os.rename(input_file, simplify_file_path(input_file))
+        input_files: List[str] = []
+        subtitles: List[str] = []
+        seen_outputs: set[str] = set()
+        duplicate_inputs: List[str] = []
+        for input_file in self.input_files:
 
-            self.input_files = simplify_file_path(input_file)
+            # The merges run at the same time, two videos with the same name,
+            # like "a.mkv" and "a.mp4", would share the subtitle and the merged
+            # file, so only the first one is merged
+            simplified_file = simplify_file_path(input_file)
+            output_key = _output_key(os.path.splitext(simplified_file)[0])
 
-            name = Path(input_file).stem
-            filename = Path(input_file).name
+            if output_key in seen_outputs:
+                duplicate_inputs.append(os.path.basename(input_file))
+                continue
 
-            message = self.json_translations["ProgressBar"][
-                "merge_to_subtitle_message"
-            ].format(
-                filename=filename, current_file=i + 1, total_files=self.total_files
-            )
+            seen_outputs.add(output_key)
 
-            progress_bar_obj.set_label_text(message, self.master)
+            # Assume the subtitles have the same name as the video file. It's
+            # derived from the original name, the subtitle still has its quote
+            # characters until it's renamed along with the merge
+            subtitles.append(os.path.splitext(input_file)[0] + ".srt")
 
-            # output file will be like "video.srt.mkv"
-            merged = (
-                simplify_file_path(Path(input_file).parent) + "/" + name + ".srt.mkv"
-            )
+            # Get rid of quote characters
+            os.rename(input_file, simplified_file)
 
-            # Assume the subtitles have the same name as the video file
-            subtitle = input_file.replace(filename, name + ".srt")
+            input_files.append(simplified_file)
 
-            subtitle_exists = encode_subtitle_to_utf8(subtitle)
+        if duplicate_inputs:
+            self.warn_duplicate_outputs(progress_bar_obj, duplicate_inputs)
 
-            if isinstance(subtitle_exists, str):
-                progress_bar_obj.root.destroy()
+        input_paths = [Path(input_file) for input_file in input_files]
+
+        # The encodings are detected in parallel, off the Tk thread, each worker
+        # thread has its own detector. The subtitles are converted by the merge
+        charenc_futures = self.run_in_background(
+            progress_bar_obj, _parallel_submit, detect_subtitle_charenc, subtitles
+        )
+
+        jobs: List[Tuple[str, List[FfmpegPipeProgress]]] = []
+        merged_files: List[Tuple[Path, str]] = []
+        for i, (input_file, input_path, subtitle, charenc_future) in enumerate(
+            zip(input_files, input_paths, subtitles, charenc_futures)
+        ):
+            try:
+                charenc = charenc_future.result()
+
+            except FileNotFoundError:
                 messagebox.showerror(
                     "Error",
-                    message=subtitle_exists,
+                    message=self.json_translations["MessageBox"][
+                        "error_subtitle_not_found"
+                    ].format(filename=Path(subtitle).stem),
+                    parent=progress_bar_obj.root,
+                )
+                continue
+
+            # Only this file is skipped, the others are still merged
+            except LookupError:
+                messagebox.showerror(
+                    "Error",
+                    message=self.json_translations["MessageBox"][
+                        "error_subtitle_encoding"
+                    ].format(filename=Path(subtitle).name),
+                    parent=progress_bar_obj.root,
                 )
                 continue
 
+            message = merge_to_subtitle_message.format(
+                filename=input_path.name,
+                current_file=i + 1,
+                total_files=self.total_files,
+            )
+
+            # output file will be like "video.srt.mkv"
+            merged = os.path.join(
+                simplify_file_path(input_path.parent), input_path.stem + ".srt.mkv"
+            )
+
             if os.path.exists(subtitle):
-                os.rename(subtitle, simplify_file_path(subtitle))
-                subtitle = simplify_file_path(subtitle)
+                simplified_subtitle = simplify_file_path(subtitle)
+                os.rename(subtitle, simplified_subtitle)
+                subtitle = simplified_subtitle
 
             else:
                 subtitle = ""
 
-            command = FfmpegProgress(
+            # The subtitle's encoding is an option of its input, so it goes right
+            # before it
+            subtitle_input = ["-i", subtitle]
+
+            if charenc is not None:
+                subtitle_input = ["-sub_charenc", charenc, *subtitle_input]
+
+            command = FfmpegPipeProgress(
                 [
                     "ffmpeg",
                     "-i",
                     input_file,
-                    "-i",
-                    subtitle,
+                    *subtitle_input,
                     "-map",
                     "0",
                     "-map",
@@ -464,47 +937,49 @@ class VideoAdjuster:
                     "-metadata:s:s:0",
                     f"title={subtitle_language}",
                     merged,
+                    "-y",
                 ],
             )
 
-            progress_thread = self.thread_function(progress_bar_obj, command)
+            # Each merge gets its own ffmpeg process rather than one process with
+            # an output group per file: a single bad file would fail the whole
+            # batch, and the progress of every file could not be followed.
+            # The processes already run in parallel, and a stream copy is bound
+            # by the disk, not by the process startup
+            commands = [command]
 
-            Path(input_file).unlink(missing_ok=True)
-            Path(subtitle).unlink(missing_ok=True)
+            # mkvmerge remuxes Matroska faster, ffmpeg is kept as its fallback
+            mkvmerge_command = mkvmerge_subtitle_command(
+                input_file, subtitle, subtitle_language, merged, charenc
+            )
 
-            return_value = progress_thread.join()
+            if mkvmerge_command is not None:
+                commands.insert(0, mkvmerge_command)
 
-            if not return_value or return_value == "error":
-                messagebox.showerror(
-                    self.json_translations["MessageBox"]["error"],
-                    message=message
-                    + "\n\n"
-                    + self.json_translations["MessageBox"]["error_ffmpeg_command"],
-                )
-                progress_bar_obj.root.destroy()
-                success = False
-                break
+            jobs.append((message, commands))
+            merged_files.append((input_path, subtitle))
 
-        if progress_bar_obj.root:
-            try:
-                progress_bar_obj.root.destroy()
-            except TclError:
-                pass
+        results = self.run_jobs(progress_bar_obj, jobs)
 
-        if success:
-            messagebox.showinfo(
-                self.json_translations["MessageBox"]["success"],
-                message=self.json_translations["MessageBox"]["success_message"],
-            )
+        # The sources are only removed once they were merged
+        for (input_path, subtitle), result in zip(merged_files, results):
+            if result is True:
+                input_path.unlink(missing_ok=True)
+                Path(subtitle).unlink(missing_ok=True)
+
+        self.show_results(progress_bar_obj, jobs, results)
 
 
 if __name__ == "__main__":
 
-    videos = []
-    for video in os.listdir("./origin"):
-        video = os.path.join(os.getcwd(), "origin", video)
-        if is_video_or_audio_file(video):
-            videos.append(video)
+    # The entries carry their type, so directories are skipped without a stat
+    # call, and the files with unknown extensions are probed in one batch
+    with os.scandir(os.path.join(os.getcwd(), "origin")) as entries:
+        classified = classify_video_or_audio_files(
+            entry.path for entry in entries if entry.is_file()
+        )
+
+    videos = [video for video, is_video in classified.items() if is_video]
 
     print(*videos, sep="\n")
 